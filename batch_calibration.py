@@ -0,0 +1,156 @@
+import os
+import time
+import itertools
+import traceback
+import os.path as osp
+from datetime import datetime
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from data.data_preprocessing import EpiData
+from data.incidence_aggregation import IncidenceAggregation
+from utils.utils import get_config
+from main import calibrate, load_contact_matrix
+
+
+@dataclass(frozen=True)
+class CalibrationJob:
+    city: str
+    data_path: str
+    year: int
+    incidence: str
+    mu: float
+    sigma: float
+
+    @property
+    def name(self):
+        city = "_".join(self.city.lower().split())
+        return f'{city}_{self.incidence}_{self.year}_mu_{self.mu}_sigma_{self.sigma}'
+
+
+def get_jobs(config):
+    """Builds the jobs of every combination of the values in the BATCH section of the config"""
+    batch = config['BATCH']
+    incidence_types = batch.get('incidence_types', [config['INCIDENCE_TYPE']])
+    if not config['DATA_DETAIL'] or not config['MODEL_DETAIL']:
+        incidence_types = ['total']
+
+    jobs = []
+    for (city, data_path), year, incidence, mu, sigma in itertools.product(batch['cities'].items(),
+                                                                          batch.get('years', [config['year']]),
+                                                                          dict.fromkeys(incidence_types),
+                                                                          batch.get('percent_protected',
+                                                                                    [config['percent_protected']]),
+                                                                          batch.get('sigma', [config['sigma']])):
+        jobs.append(CalibrationJob(city, data_path, year, incidence, mu, sigma))
+    return jobs
+
+
+def load_input_data(config, jobs):
+    """
+    Loads every data file and contact matrix once, they are shared by all the jobs
+    returns: EpiData objects by (data path, incidence type), contact matrices by incidence type
+    """
+    aggregations, epidemic_data, contact_matrices = {}, {}, {}
+    for job in jobs:
+        if job.data_path not in aggregations:
+            aggregations[job.data_path] = IncidenceAggregation.from_csv(job.data_path, config['age_groups'],
+                                                                        config['strains'])
+        if (job.data_path, job.incidence) not in epidemic_data:
+            epidemic_data[job.data_path, job.incidence] = EpiData(job.data_path, job.incidence,
+                                                                  config['age_groups'], config['strains'],
+                                                                  aggregation=aggregations[job.data_path])
+        if job.incidence not in contact_matrices:
+            contact_matrices[job.incidence] = load_contact_matrix(config, job.incidence)
+    return epidemic_data, contact_matrices
+
+
+_worker_input = {}
+
+
+def _init_worker(config, epidemic_data, contact_matrices):
+    """Keeps the config and the loaded data in a worker, so they are sent to every worker only once"""
+    _worker_input.update(config=config, epidemic_data=epidemic_data, contact_matrices=contact_matrices)
+
+
+def run_job(job, batch_dir, processes):
+    """
+    Calibrates one job in a worker process
+    returns (dict): summary row of the job
+    """
+    config = _worker_input['config']
+    epi_data = _worker_input['epidemic_data'][job.data_path, job.incidence]
+    start = time.time()
+
+    weekly_data = epi_data.incidence_for_season(job.year)
+    pop_size = epi_data.pop_size(job.year)
+    opt_parameters, full_path = calibrate(config, weekly_data, pop_size,
+                                          _worker_input['contact_matrices'][job.incidence],
+                                          job.city, job.year, job.incidence, job.mu, job.sigma,
+                                          full_path=osp.join(batch_dir, job.name), processes=processes)
+
+    return {'R2': opt_parameters['R2'],
+            'delta': opt_parameters['delta'],
+            'seed': opt_parameters['seed'],
+            'elapsed': time.time() - start,
+            'results': full_path}
+
+
+def run_batch(config, jobs):
+    """
+    Calibrates the jobs across a pool of BATCH.workers processes; a failed job is retried BATCH.retries
+    times and recorded in the summary without stopping the other jobs
+    returns (DataFrame): summary of the jobs
+    """
+    batch = config['BATCH']
+    workers = max(min(batch.get('workers', 1), len(jobs)), 1)
+    retries = batch.get('retries', 1)
+    # the optimizer processes are split between the jobs running at once
+    processes = max((config.get('PROCESSES') or max(os.cpu_count() - 1, 1)) // workers, 1)
+
+    batch_dir = osp.join(config['output_folder'], 'batch', datetime.now().strftime("%Y_%m_%d_%H_%M"))
+    os.makedirs(batch_dir, exist_ok=True)
+    epidemic_data, contact_matrices = load_input_data(config, jobs)
+
+    attempts = dict.fromkeys(jobs, 0)
+    rows = {}
+    queue = list(jobs)
+    while queue:
+        # a new pool is started for the retries, since a crashed worker breaks the whole pool
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(config, epidemic_data, contact_matrices)) as executor:
+            futures = {executor.submit(run_job, job, batch_dir, processes): job for job in queue}
+            queue = []
+            for future in as_completed(futures):
+                job = futures[future]
+                attempts[job] += 1
+                try:
+                    rows[job] = dict(status='done', **future.result())
+                    print(f"Job {job.name} is done, R2: {rows[job]['R2']}")
+                except Exception as e:
+                    error = ''.join(traceback.format_exception_only(type(e), e)).strip()
+                    print(f"Job {job.name} failed (attempt {attempts[job]}): {error}")
+                    if attempts[job] <= retries:
+                        queue.append(job)
+                    else:
+                        rows[job] = {'status': 'failed', 'error': error}
+
+    summary = pd.DataFrame([dict(city=job.city, year=job.year, incidence=job.incidence, mu=job.mu,
+                                 sigma=job.sigma, attempts=attempts[job], **rows[job]) for job in jobs])
+    summary.to_csv(osp.join(batch_dir, 'summary.csv'), index=False)
+    return summary
+
+
+def main():
+    config = get_config('config.yaml')
+    jobs = get_jobs(config)
+    print(f"Calibrating {len(jobs)} outbreaks")
+
+    summary = run_batch(config, jobs)
+    print(summary.to_string())
+
+
+if __name__ == '__main__':
+    main()
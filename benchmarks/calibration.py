@@ -0,0 +1,82 @@
+"""
+Benchmark of a calibration with a fixed budget, settings and seed on the bundled data: wall-clock time and
+fit function evaluations until the mean R2 of the groups first reaches the target, and of the whole calibration
+
+    python -m benchmarks.calibration [--target-r2 0.8] [--warm-start lhs] [--engines vectorized loop]
+"""
+import time
+import argparse
+import itertools
+
+import numpy as np
+
+from models.BR_model import BRModel
+from optimizers.event_sink import EventSink, QUIET
+from optimizers.objective_cache import ObjectiveCache
+from .common import DATASETS, STRAINS, INCIDENCE_TYPES, prepare_optimizer, save_results, print_cases
+
+
+class EventRecorder:
+    """Queue of the event sink keeping the events in memory"""
+    def __init__(self):
+        self.events = []
+
+    def put(self, event):
+        self.events.append(event)
+
+
+def run_case(dataset, incidence, engine, args):
+    optimizer = prepare_optimizer(dataset, incidence, STRAINS, engine)
+    optimizer.objective_cache = ObjectiveCache(args.cache_size)
+    optimizer.seed = args.seed
+    optimizer.warm_start = args.warm_start
+    optimizer.screening_samples = args.screening_samples
+    optimizer.local_method = args.local_method
+    optimizer.local_maxiter = args.local_maxiter
+    recorder = EventRecorder()
+    # the evaluations improving the fit function are always recorded
+    optimizer.events = EventSink(verbosity=QUIET, every=10 ** 9, queue=recorder)
+
+    start = time.time()
+    opt_parameters = optimizer.fit_one_outbreak()
+    wall_time = time.time() - start
+
+    time_to_target, evaluations_to_target = None, None
+    for event in recorder.events:
+        # no R2 is calculated for the simulations without an outbreak
+        if event['event'] == 'evaluation' and event['R2'] and np.mean(event['R2']) >= args.target_r2:
+            time_to_target, evaluations_to_target = event['time'] - start, event['evaluation']
+            break
+
+    return {'dataset': dataset, 'incidence': incidence, 'engine': engine, 'target_r2': args.target_r2,
+            'reached': time_to_target is not None, 'time_to_target': time_to_target,
+            'evaluations_to_target': evaluations_to_target, 'wall_time': wall_time,
+            'evaluations': optimizer.evaluations, 'R2': opt_parameters['R2'],
+            'mean_R2': float(np.mean(opt_parameters['R2']))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--datasets', nargs='+', default=['2groups'], choices=list(DATASETS))
+    parser.add_argument('--incidence-types', nargs='+', default=list(INCIDENCE_TYPES), choices=INCIDENCE_TYPES)
+    parser.add_argument('--engines', nargs='+', default=['vectorized'], choices=BRModel.engines)
+    parser.add_argument('--target-r2', type=float, default=0.8, help='mean R2 of the groups to reach')
+    parser.add_argument('--warm-start', default='lhs', choices=['anneal', 'lhs', 'sobol'])
+    parser.add_argument('--screening-samples', type=int, default=256)
+    parser.add_argument('--local-method', default='Nelder-Mead', choices=['Nelder-Mead', 'L-BFGS-B'])
+    parser.add_argument('--local-maxiter', type=int, default=100, help='iterations of every local search')
+    parser.add_argument('--cache-size', type=int, default=4096, help='objective cache size, 0 to disable')
+    parser.add_argument('--seed', type=int, default=2023)
+    parser.add_argument('--output', help='results file, benchmarks/results/calibration_<commit>.json by default')
+    args = parser.parse_args()
+
+    cases = [run_case(dataset, incidence, engine, args)
+             for dataset, incidence, engine in itertools.product(args.datasets, args.incidence_types, args.engines)]
+
+    print_cases(cases, ['incidence', 'engine', 'reached', 'time_to_target', 'evaluations_to_target',
+                        'wall_time', 'evaluations', 'mean_R2'])
+    print('Saved to', save_results('calibration', cases, vars(args), args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+import os
+import sys
+import json
+import time
+import platform
+import statistics
+import subprocess
+import os.path as osp
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from data.data_preprocessing import EpiData, get_contact_matrix
+from utils.experiment_setup import ExperimentalSetup
+
+RESULTS_DIR = osp.join(osp.dirname(__file__), 'results')
+YEAR = 2015
+
+# bundled data sets: incidence file, contact matrix and age groups of the file
+DATASETS = {
+    '2groups': ('data/input/incidence_strains_spb_2groups.csv', 'data/input/contact_matrix_revised_v2.p',
+                ['0-14', '15 и ст.']),
+    '4groups': ('data/input/incidence_strains_spb.csv', 'data/input/contact_matrix_revised.p',
+                ['0-2', '3-6', '7-14', '15 и ст.']),
+}
+STRAINS = ['A(H1N1)pdm09', 'A(H3N2)', 'B']
+INCIDENCE_TYPES = ('total', 'age-group', 'strain', 'strain_age-group')
+
+
+def load_case(dataset, incidence, strains, year=YEAR):
+    """
+    Loads the season data of a benchmark case
+    returns: weekly data, population size, contact matrix, age groups
+    """
+    data_path, contact_matrix_path, age_groups = DATASETS[dataset]
+    epi_data = EpiData(data_path, incidence, age_groups, strains)
+    contact_matrix = get_contact_matrix(contact_matrix_path) if incidence not in ['strain', 'total'] else [[6.528]]
+    return epi_data.incidence_for_season(year), epi_data.pop_size(year), contact_matrix, age_groups
+
+
+def parameter_vector(optimizer):
+    """
+    Fixed calibrated parameter vector of the optimizer layout: exposed shares, lambdas and a,
+    so that the cases with different numbers of age groups and strains are comparable
+    """
+    incidence = optimizer.incidence_type
+    age_groups_num, strains_num = len(optimizer.age_groups), len(optimizer.strains)
+    if incidence in ('strain', 'strain_age-group'):
+        exposed = [0.6 / strains_num] * (age_groups_num * strains_num)
+        lam = [0.1] * strains_num
+        a = [0.5] * (age_groups_num if incidence == 'strain_age-group' else 1)
+    else:
+        exposed = [0.6] * age_groups_num
+        lam = [0.1]
+        a = [0.5]
+    return np.array(exposed + lam + a, dtype=float)
+
+
+def measure(func, repeat, warmup=1):
+    """
+    Runs func warmup + repeat times
+    returns (dict): min, median and mean seconds of the measured runs
+    """
+    for _ in range(warmup):
+        func()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {'repeat': repeat, 'min': min(times), 'median': statistics.median(times), 'mean': statistics.fmean(times)}
+
+
+def environment():
+    """Commit and platform the benchmark is run on"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = None, None
+    return {'commit': commit, 'dirty': dirty, 'time': datetime.now().isoformat(timespec='seconds'),
+            'python': sys.version.split()[0], 'numpy': np.__version__, 'pandas': pd.__version__,
+            'platform': platform.platform(), 'cpus': os.cpu_count()}
+
+
+def save_results(name, cases, settings, output=None):
+    """
+    Saves the benchmark cases as JSON, to benchmarks/results/<name>_<commit>.json by default
+    returns (str): results file path
+    """
+    env = environment()
+    if output is None:
+        suffix = (env['commit'] or datetime.now().strftime('%Y_%m_%d_%H_%M')) + ('_dirty' if env['dirty'] else '')
+        output = osp.join(RESULTS_DIR, f'{name}_{suffix}.json')
+    os.makedirs(osp.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({'benchmark': name, 'environment': env, 'settings': settings, 'cases': cases}, f, indent=4)
+    return output
+
+
+def print_cases(cases, columns):
+    print(pd.DataFrame(cases)[columns].to_string(index=False))
+
+
+def prepare_optimizer(dataset, incidence, strains, engine='vectorized', mu=0.2, sigma=1.0, dtype='float64'):
+    """Builds the optimizer of a benchmark case with the calibration context set as in fit_one_outbreak"""
+    data, pop_size, contact_matrix, age_groups = load_case(dataset, incidence, strains)
+    optimizer = ExperimentalSetup(incidence, age_groups, strains, contact_matrix, pop_size, mu, sigma, engine) \
+        .setup_experiment(data, incidence != 'total')  # the total incidence is fitted by the grouped model
+    optimizer.model.dtype = dtype
+    optimizer.calib_data_weekly = optimizer.df_data_weekly
+    optimizer.data_weights = optimizer._get_data_weights(optimizer.df_data_weekly, sigma)
+    optimizer._set_calibration_context()
+    return optimizer
@@ -0,0 +1,57 @@
+"""
+Compares two benchmark results files (e.g. of two commits or engines) case by case
+
+    python -m benchmarks.compare benchmarks/results/simulation_<old>.json benchmarks/results/simulation_<new>.json
+"""
+import json
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# fields describing a case, the other fields are measurements
+CASE_FIELDS = ['dataset', 'incidence', 'age_groups', 'strains', 'horizon', 'engine', 'dtype', 'batch_size',
+               'peak_offsets', 'target_r2']
+# measurement compared by default for every benchmark
+METRICS = {'simulation': 'per_simulation', 'fit_function': 'per_evaluation', 'calibration': 'time_to_target'}
+
+
+def load_cases(path):
+    with open(path, 'r') as f:
+        results = json.load(f)
+    return results, pd.DataFrame(results['cases'])
+
+
+def compare(baseline_path, candidate_path, metric=None, ignore=()):
+    """
+    returns (DataFrame): metric of the cases found in both files and the candidate/baseline ratio
+    """
+    baseline, baseline_cases = load_cases(baseline_path)
+    candidate, candidate_cases = load_cases(candidate_path)
+    metric = metric or METRICS[baseline['benchmark']]
+
+    keys = [field for field in CASE_FIELDS
+            if field in baseline_cases and field in candidate_cases and field not in ignore]
+    merged = baseline_cases[keys + [metric]].merge(candidate_cases[keys + [metric]], on=keys,
+                                                   suffixes=('_baseline', '_candidate'))
+    merged['ratio'] = merged[metric + '_candidate'] / merged[metric + '_baseline']
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--metric', help='measurement to compare, per simulation/evaluation time by default')
+    parser.add_argument('--ignore', nargs='*', default=[],
+                        help="case fields not matched on, e.g. 'engine' to compare runs with different engines")
+    args = parser.parse_args()
+
+    merged = compare(args.baseline, args.candidate, args.metric, args.ignore)
+    print(merged.to_string(index=False))
+    ratios = merged['ratio'].dropna()
+    print(f"Geometric mean ratio: {np.exp(np.log(ratios).mean()):.3f}" if len(ratios) else "No common cases")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark of the end-to-end fit function cost on the bundled data: a single evaluation (simulation,
+weekly aggregation, peak alignment and scoring) and a batched one per parameter vector, with the objective
+cache disabled, and the per-stage breakdown of the single evaluations
+
+    python -m benchmarks.fit_function [--engines vectorized loop] [--dtypes float64 float32] [--repeat 10]
+"""
+import argparse
+import itertools
+
+import numpy as np
+
+from models.BR_model import BRModel
+from optimizers.objective_cache import ObjectiveCache
+from optimizers.profiler import StageProfiler, HOT_PATH_STAGES
+from optimizers.aux_functions import param_range_functions as pr
+from .common import DATASETS, STRAINS, INCIDENCE_TYPES, prepare_optimizer, measure, save_results, print_cases
+
+
+def run_case(dataset, incidence, engine, dtype, repeat, batch_size, peak_offsets):
+    optimizer = prepare_optimizer(dataset, incidence, STRAINS, engine, dtype=dtype)
+    optimizer.objective_cache = ObjectiveCache(0)
+    if peak_offsets > 1:
+        optimizer.tpeak_candidates = tuple(range(peak_offsets))
+    # middle of the calibrated parameter ranges
+    k = np.asarray(pr.set_parameters_range(incidence), dtype=float).mean(axis=1)
+
+    case = {'dataset': dataset, 'incidence': incidence, 'engine': engine, 'dtype': dtype, 'peak_offsets': peak_offsets,
+            'batch_size': 1}
+    timing = measure(lambda: optimizer.compute_fit_function(k), repeat)
+    case.update(timing, per_evaluation=timing['median'], R2=optimizer.R_square_list)
+
+    optimizer.profiler = StageProfiler(True)
+    for _ in range(repeat):
+        optimizer.compute_fit_function(k)
+    stats = optimizer.profiler.stats()
+    case['stages'] = {name: stats[name]['seconds'] / stats[name]['calls'] for name in HOT_PATH_STAGES if name in stats}
+    optimizer.profiler = StageProfiler()
+    cases = [case]
+
+    if batch_size > 1 and engine == 'vectorized':
+        K = np.tile(k, (batch_size, 1))
+        timing = measure(lambda: optimizer.fit_function_batch(K), repeat)
+        cases.append(dict(case, batch_size=batch_size, **timing, per_evaluation=timing['median'] / batch_size,
+                          stages=None))
+    # the simulation buffers are allocated by the first evaluations and reused by the following ones
+    for case in cases:
+        case.update(buffer_bytes=optimizer.simulation_buffers.nbytes,
+                    buffer_allocations=optimizer.simulation_buffers.allocations)
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    # the calibrated parameter ranges are defined for the age groups of the 2groups data set
+    parser.add_argument('--datasets', nargs='+', default=['2groups'], choices=list(DATASETS))
+    parser.add_argument('--incidence-types', nargs='+', default=list(INCIDENCE_TYPES), choices=INCIDENCE_TYPES)
+    parser.add_argument('--engines', nargs='+', default=['vectorized'], choices=BRModel.engines)
+    parser.add_argument('--dtypes', nargs='+', default=['float64'], choices=['float64', 'float32'])
+    parser.add_argument('--batch-size', type=int, default=16, help='parameter vectors per batched evaluation')
+    parser.add_argument('--peak-offsets', type=int, default=1, help='candidate peak offsets (prediction mode)')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--output', help='results file, benchmarks/results/fit_function_<commit>.json by default')
+    args = parser.parse_args()
+
+    cases = []
+    for dataset, incidence, engine, dtype in itertools.product(args.datasets, args.incidence_types, args.engines,
+                                                               args.dtypes):
+        cases.extend(run_case(dataset, incidence, engine, dtype, args.repeat, args.batch_size, args.peak_offsets))
+
+    print_cases(cases, ['incidence', 'engine', 'dtype', 'batch_size', 'median', 'per_evaluation', 'buffer_bytes'])
+    print('Saved to', save_results('fit_function', cases, vars(args), args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+Golden output regression harness: the saved parameters of every stored calibration run are simulated again
+with each engine and the weekly model curve is compared to the saved model_fit.csv
+
+The golden runs are pinned in the committed baseline file together with the runs that cannot be replayed
+(older runs made with earlier versions of the model or data). Every engine must reproduce the pinned golden
+runs and agree with the reference engine on every run; a pinned run missing from the results and a run that
+cannot be replayed without being listed in the baseline fail the check as well. The exit code is 1 on failure.
+The baseline is written from the reference engine results with --update-baseline
+
+    python -m benchmarks.golden [--root output/data] [--engines vectorized loop] [--rtol 1e-3] [--update-baseline]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import traceback
+
+import numpy as np
+
+from models.BR_model import BRModel
+from utils.utils import get_config, restore_fit_from_params
+from utils.result_store import ResultStore
+from .common import STRAINS, load_case, save_results, print_cases
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden_baseline.json')
+
+
+def get_dataset(model_fit):
+    """Data set of the run: the 4 age groups one if its curves are of the 0-2 years age group"""
+    return '4groups' if any('0-2' in str(column) for column in model_fit.columns) else '2groups'
+
+
+def max_deviation(simulated, saved):
+    """
+    returns: maximum absolute deviation over the common weeks and groups, relative to the saved curve maximum
+    """
+    weeks = min(len(simulated), len(saved))
+    deviation = np.abs(simulated.to_numpy(dtype=float)[:weeks] - saved.to_numpy(dtype=float)[:weeks])
+    absolute = float(np.nanmax(deviation))
+    return absolute, absolute / max(float(np.nanmax(np.abs(saved.to_numpy(dtype=float)))), 1e-12)
+
+
+def replay_run(run, engines, default_mu, default_sigma):
+    """
+    Simulates the saved parameters of the run with every engine
+    returns: data set of the run, simulated weekly curves and timings by engine
+    """
+    dataset = get_dataset(run.model_fit)
+    _, pop_size, contact_matrix, age_groups = load_case(dataset, run.incidence, STRAINS, run.year)
+    mu = run.mu if run.mu is not None else default_mu
+    sigma = run.sigma if run.sigma is not None else default_sigma
+
+    curves, timings = {}, {}
+    for engine in engines:
+        start = time.perf_counter()
+        _, curves[engine], _, _ = restore_fit_from_params(contact_matrix, pop_size, run.incidence, age_groups,
+                                                          STRAINS, mu, sigma, run=run, engine=engine)
+        timings[engine] = time.perf_counter() - start
+    return dataset, curves, timings
+
+
+def check_run(store, run_id, args, default_mu, default_sigma):
+    run = store.load(run_id)
+    case = {'run': run.source or run_id, 'name': os.path.basename(run.source or str(run_id)),
+            'incidence': run.incidence, 'year': run.year, 'mu_assumed': run.mu is None}
+    try:
+        case['dataset'], curves, timings = replay_run(run, args.engines, default_mu, default_sigma)
+    except Exception as e:
+        case['error'] = ''.join(traceback.format_exception_only(type(e), e)).strip()
+        return case
+
+    reference = curves[args.reference_engine]
+    case['golden'] = max_deviation(reference, run.model_fit)[1] <= args.rtol
+    for engine in args.engines:
+        absolute, relative = max_deviation(curves[engine], run.model_fit)
+        case[f'{engine}_deviation'] = relative
+        case[f'{engine}_abs_deviation'] = absolute
+        case[f'{engine}_seconds'] = timings[engine]
+        case[f'{engine}_vs_reference'] = max_deviation(curves[engine], reference)[1]
+    return case
+
+
+def load_baseline(path):
+    """
+    returns (dict): pinned golden runs and the not replayable runs with their errors
+    """
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_baseline(path, cases, args):
+    """Pins the golden runs found by the reference engine and the runs that cannot be replayed"""
+    baseline = {'reference_engine': args.reference_engine, 'rtol': args.rtol,
+                'golden': sorted(case['run'] for case in cases if case.get('golden')),
+                'not_replayable': {case['run']: case['error'] for case in sorted(cases, key=lambda case: case['run'])
+                                   if 'error' in case}}
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=4)
+
+
+def get_failure(case, baseline, args):
+    """
+    returns (str): reason why the run fails the check or None: a pinned golden run is not reproduced by an engine,
+                   an engine deviates from the reference engine or the run cannot be replayed unexpectedly
+    """
+    if 'error' in case:
+        return None if case['run'] in baseline['not_replayable'] else f"not replayable: {case['error']}"
+    for engine in sorted(args.engines, key=lambda engine: engine != args.reference_engine):
+        if case['pinned'] and case[f'{engine}_deviation'] > args.rtol:
+            return f"{engine} does not reproduce the golden run"
+        if case[f'{engine}_vs_reference'] > args.rtol:
+            return f"{engine} deviates from the {args.reference_engine} engine"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--root', default='output/data', help='directory of the saved calibration results')
+    parser.add_argument('--store', help='result store file to check instead of the results directories')
+    parser.add_argument('--engines', nargs='+', default=list(BRModel.engines), choices=BRModel.engines)
+    parser.add_argument('--reference-engine', default='loop', choices=BRModel.engines)
+    parser.add_argument('--rtol', type=float, default=1e-3,
+                        help='maximum deviation from the saved curve relative to its maximum')
+    parser.add_argument('--output', help='results file, benchmarks/results/golden_<commit>.json by default')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='pinned golden and not replayable runs')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='pin the golden runs found by the reference engine instead of checking them')
+    args = parser.parse_args()
+    if args.reference_engine not in args.engines:
+        args.engines.insert(0, args.reference_engine)
+
+    # mu and sigma of the runs without them in the directory name are taken from the config
+    config = get_config('config.yaml')
+    store = ResultStore(args.store or ':memory:')
+    if args.store is None:
+        for dir_path, _, _ in os.walk(args.root):
+            store.import_directory(dir_path)
+
+    cases = [check_run(store, int(run_id), args, config['percent_protected'], config['sigma'])
+             for run_id in store.find()['id']]
+    if args.update_baseline:
+        save_baseline(args.baseline, cases, args)
+        print('Baseline saved to', args.baseline)
+    if not os.path.exists(args.baseline):
+        sys.exit(f"No baseline file {args.baseline}, write it with --update-baseline")
+    baseline = load_baseline(args.baseline)
+
+    pinned = set(baseline['golden'])
+    for case in cases:
+        case['pinned'] = case['run'] in pinned
+        case['failure'] = get_failure(case, baseline, args)
+    found = {case['run'] for case in cases}
+    missing = sorted(pinned - found)
+    failed = [case for case in cases if case['failure'] is not None]
+
+    checked = [case for case in cases if 'error' not in case]
+    print_cases(checked, ['name', 'pinned', 'golden'] +
+                [f'{engine}_{field}' for engine in args.engines for field in ('deviation', 'vs_reference', 'seconds')])
+    for engine in args.engines:
+        seconds = [case[f'{engine}_seconds'] for case in checked]
+        print(f"{engine}: {np.mean(seconds) if seconds else float('nan'):.4f} s per run")
+    print(f"{len(cases)} runs: {len(pinned)} pinned golden, {len(cases) - len(checked)} not replayable, "
+          f"{len(failed) + len(missing)} failed")
+    for case in cases:
+        if 'error' in case:
+            print('Not replayable:', case['run'], '-', case['error'])
+    for case in checked:
+        if case['golden'] and not case['pinned']:
+            print('Golden, not pinned in the baseline:', case['run'])
+    for case in failed:
+        print('Failed:', case['run'], '-', case['failure'])
+    for run in missing:
+        print('Failed:', run, '- pinned golden run not found')
+    print('Saved to', save_results('golden', cases, vars(args), args.output))
+    sys.exit(1 if failed or missing else 0)
+
+
+if __name__ == '__main__':
+    main()
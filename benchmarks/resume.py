@@ -0,0 +1,95 @@
+"""
+Checkpoint resume check: a calibration chain interrupted during the local search and resumed from its
+checkpoint must end with the same parameters as the uninterrupted chain. The exit code is 1 if it does not
+
+    python -m benchmarks.resume [--incidence-types strain age-group] [--local-methods Nelder-Mead L-BFGS-B]
+"""
+import sys
+import argparse
+import tempfile
+import itertools
+
+import numpy as np
+
+from optimizers.event_sink import EventSink, QUIET
+from .common import DATASETS, STRAINS, INCIDENCE_TYPES, prepare_optimizer, save_results, print_cases
+
+
+class Interrupted(Exception):
+    pass
+
+
+class Interrupter:
+    """Queue of the event sink interrupting the calibration after a number of the local search evaluations"""
+    def __init__(self, evaluations):
+        self.evaluations = evaluations
+
+    def put(self, event):
+        if event['event'] == 'evaluation' and event['stage'] == 'local':
+            self.evaluations -= 1
+            if self.evaluations < 0:
+                raise Interrupted()
+
+
+def run_chain(dataset, incidence, local_method, args, checkpoint_dir=None, interrupt_after=None):
+    """
+    Calibrates the case with a single chain
+    returns (dict): calibrated parameters
+    """
+    optimizer = prepare_optimizer(dataset, incidence, STRAINS)
+    optimizer.seed = args.seed
+    optimizer.warm_start = 'lhs'
+    optimizer.screening_samples = args.screening_samples
+    optimizer.screening_top_k = args.screening_top_k
+    optimizer.local_method = local_method
+    optimizer.local_maxiter = args.local_maxiter
+    optimizer.checkpoint_dir = checkpoint_dir
+    optimizer.checkpoint_interval = 0.0  # the chain is checkpointed after every evaluation
+    # every evaluation is recorded, so that the interrupter counts them
+    optimizer.events = EventSink(verbosity=QUIET, queue=Interrupter(interrupt_after) if interrupt_after else None)
+    return optimizer.fit_one_outbreak()
+
+
+def run_case(dataset, incidence, local_method, args):
+    uninterrupted = run_chain(dataset, incidence, local_method, args)
+    with tempfile.TemporaryDirectory() as checkpoint_dir:
+        try:
+            run_chain(dataset, incidence, local_method, args, checkpoint_dir, args.interrupt_after)
+            interrupted = False
+        except Interrupted:
+            interrupted = True
+        resumed = run_chain(dataset, incidence, local_method, args, checkpoint_dir)
+
+    same_parameters = all(np.array_equal(uninterrupted[name], resumed[name]) for name in ('exposed', 'lambda', 'a'))
+    return {'dataset': dataset, 'incidence': incidence, 'local_method': local_method, 'interrupted': interrupted,
+            'same_parameters': same_parameters,
+            'uninterrupted_R2': uninterrupted['R2'], 'resumed_R2': resumed['R2']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--datasets', nargs='+', default=['2groups'], choices=list(DATASETS))
+    parser.add_argument('--incidence-types', nargs='+', default=['age-group', 'strain'], choices=INCIDENCE_TYPES)
+    parser.add_argument('--local-methods', nargs='+', default=['Nelder-Mead', 'L-BFGS-B'],
+                        choices=['Nelder-Mead', 'L-BFGS-B'])
+    parser.add_argument('--interrupt-after', type=int, default=60, help='local search evaluations before the crash')
+    parser.add_argument('--screening-samples', type=int, default=64)
+    parser.add_argument('--screening-top-k', type=int, default=2)
+    parser.add_argument('--local-maxiter', type=int, default=100, help='iterations of every local search')
+    parser.add_argument('--seed', type=int, default=2023)
+    parser.add_argument('--output', help='results file, benchmarks/results/resume_<commit>.json by default')
+    args = parser.parse_args()
+
+    cases = [run_case(dataset, incidence, local_method, args) for dataset, incidence, local_method
+             in itertools.product(args.datasets, args.incidence_types, args.local_methods)]
+    failed = [case for case in cases if not (case['interrupted'] and case['same_parameters'])]
+
+    print_cases(cases, ['incidence', 'local_method', 'interrupted', 'same_parameters', 'uninterrupted_R2',
+                        'resumed_R2'])
+    print(f"{len(cases)} cases, {len(failed)} failed")
+    print('Saved to', save_results('resume', cases, vars(args), args.output))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark of BRModel.make_simulation for every incidence type, number of age groups and strains,
+simulation horizon, engine and floating point type; the batched engine is measured per simulated parameter vector
+
+    python -m benchmarks.simulation [--engines vectorized loop] [--dtypes float64 float32] [--horizons 365 1800]
+"""
+import argparse
+import itertools
+
+import numpy as np
+
+from models.BR_model import BRModel
+from .common import DATASETS, STRAINS, INCIDENCE_TYPES, prepare_optimizer, parameter_vector, measure, save_results, \
+    print_cases
+
+
+def get_cases(datasets, incidence_types, strains_nums):
+    for dataset, incidence, strains_num in itertools.product(datasets, incidence_types, strains_nums):
+        # the age groups of the data are summed up in the strain and total incidence types
+        if incidence in ('strain', 'total') and dataset != datasets[0]:
+            continue
+        # strains are summed up in the age-group and total incidence types
+        if incidence in ('age-group', 'total') and strains_num != strains_nums[-1]:
+            continue
+        yield dataset, incidence, STRAINS[:strains_num]
+
+
+def run_case(dataset, incidence, strains, horizon, engine, dtype, repeat, batch_size):
+    optimizer = prepare_optimizer(dataset, incidence, strains, engine, dtype=dtype)
+    model = optimizer.model
+    model.N = horizon
+    exposed_list, lam_list, a = optimizer.unpack_parameters(parameter_vector(optimizer))
+
+    def simulate():
+        model.set_attributes()
+        model.init_simul_params(exposed_list, lam_list, a)
+        model.set_attributes()
+        model.make_simulation()
+
+    case = {'dataset': dataset, 'incidence': incidence, 'age_groups': len(optimizer.age_groups),
+            'strains': len(strains), 'horizon': horizon, 'engine': engine, 'dtype': dtype,
+            'batch_size': 1}
+    timing = measure(simulate, repeat)
+    case.update(timing, simulated_days=int(model.simulated_days), per_simulation=timing['median'])
+    cases = [case]
+
+    if batch_size > 1 and engine == 'vectorized':
+        K = np.tile(parameter_vector(optimizer), (batch_size, 1))
+        params = list(zip(*[optimizer.unpack_parameters(k) for k in K]))
+
+        def simulate_batch():
+            model.set_attributes()
+            model.simulate_batch(*params)
+
+        timing = measure(simulate_batch, repeat)
+        cases.append(dict(case, batch_size=batch_size, **timing, per_simulation=timing['median'] / batch_size))
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--datasets', nargs='+', default=list(DATASETS), choices=list(DATASETS))
+    parser.add_argument('--incidence-types', nargs='+', default=list(INCIDENCE_TYPES), choices=INCIDENCE_TYPES)
+    parser.add_argument('--strains', nargs='+', type=int, default=[1, 2, 3], help='numbers of strains')
+    parser.add_argument('--horizons', nargs='+', type=int, default=[365, 1800], help='simulation horizons in days')
+    parser.add_argument('--engines', nargs='+', default=['vectorized'], choices=BRModel.engines)
+    parser.add_argument('--dtypes', nargs='+', default=['float64'], choices=['float64', 'float32'])
+    parser.add_argument('--batch-size', type=int, default=16, help='parameter vectors per batched simulation')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='results file, benchmarks/results/simulation_<commit>.json by default')
+    args = parser.parse_args()
+
+    cases = []
+    for dataset, incidence, strains in get_cases(args.datasets, args.incidence_types, sorted(args.strains)):
+        for horizon, engine, dtype in itertools.product(args.horizons, args.engines, args.dtypes):
+            cases.extend(run_case(dataset, incidence, strains, horizon, engine, dtype, args.repeat, args.batch_size))
+
+    print_cases(cases, ['incidence', 'age_groups', 'strains', 'horizon', 'engine', 'dtype', 'batch_size',
+                        'simulated_days', 'median', 'per_simulation'])
+    print('Saved to', save_results('simulation', cases, vars(args), args.output))
+
+
+if __name__ == '__main__':
+    main()
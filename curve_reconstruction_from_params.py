@@ -1,11 +1,8 @@
 import os.path as osp
 from datetime import datetime
-from sklearn.metrics import r2_score
 
 from utils.experiment_setup import ExperimentalSetup
 from data.data_preprocessing import get_contact_matrix, prepare_calibration_data
-
-from visualization.visualization import plot_fitting
 from utils.utils import get_config, restore_fit_from_params
 
 
@@ -35,6 +32,9 @@ def main(output_dir):
         restore_fit_from_params(contact_matrix, pop_size, incidence,
                                 age_groups, strains, mu, sigma, output_dir)
 
+    from sklearn.metrics import r2_score  # sklearn and matplotlib are loaded only for the regenerated plot
+    from visualization.visualization import plot_fitting
+
     r2_plain = r2_score(calib_data, simul_data.iloc[calib_data.index], multioutput='raw_values').tolist()
 
     file_path_fitting = osp.join(output_dir, f'fit_{incidence}_{city}_{exposure_year}_regenerated.png')
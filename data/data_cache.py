@@ -0,0 +1,65 @@
+import os
+import json
+import hashlib
+import os.path as osp
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIR = '.cache'  # created next to the source data file
+CACHE_VERSION = 1  # to be increased when the aggregation changes
+
+
+def get_cache_key(file_path: str, incidence: str, age_groups: List[str], strains: List[str]) -> str:
+    """Hash of the source file contents and of the aggregation settings"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        digest.update(f.read())
+    digest.update(json.dumps([CACHE_VERSION, incidence, list(age_groups), list(strains)]).encode('utf8'))
+    return digest.hexdigest()
+
+
+def get_cache_paths(file_path: str, key: str):
+    cache_dir = osp.join(osp.dirname(file_path), CACHE_DIR)
+    base = osp.join(cache_dir, key)
+    return base + '_values.npy', base + '_index.npy', base + '.json'
+
+
+def load_cached_frame(file_path: str, key: str) -> Optional[pd.DataFrame]:
+    """
+    Loads the aggregated data frame with the values memory-mapped from the cache
+    returns: data frame or None if there is no cached frame for the key
+    """
+    values_path, index_path, meta_path = get_cache_paths(file_path, key)
+    if not osp.exists(meta_path):
+        return None
+
+    with open(meta_path, 'r', encoding='utf8') as f:
+        meta = json.load(f)
+    values = np.load(values_path, mmap_mode='r')
+    index = pd.Index(np.load(index_path), name=meta['index_name'])
+    return pd.DataFrame(values, index=index, columns=meta['columns'], copy=False)
+
+
+def save_cached_frame(file_path: str, key: str, df: pd.DataFrame) -> bool:
+    """
+    Stores the aggregated data frame as .npy arrays with the column names in a JSON file,
+    frames with non-numeric columns are not cached
+    returns: whether the frame was cached
+    """
+    if not all(pd.api.types.is_float_dtype(dtype) for dtype in df.dtypes):
+        return False
+
+    values_path, index_path, meta_path = get_cache_paths(file_path, key)
+    os.makedirs(osp.dirname(meta_path), exist_ok=True)
+    meta = {'columns': list(df.columns), 'index_name': df.index.name}
+    # the metadata file is written last, so that a cache entry is complete once it exists
+    for path, save in [(values_path, lambda f: np.save(f, df.to_numpy(dtype=float))),
+                       (index_path, lambda f: np.save(f, df.index.to_numpy())),
+                       (meta_path, lambda f: f.write(json.dumps(meta, ensure_ascii=False).encode('utf8')))]:
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            save(f)
+        os.replace(tmp_path, path)
+    return True
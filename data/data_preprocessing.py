@@ -2,29 +2,50 @@ import pickle
 import pandas as pd
 from typing import List
 
-from .input_data_functions import prevalenceType, extractARIForSeason, extractPopSize
+from .incidence_aggregation import IncidenceAggregation
+from .season_index import SeasonIndex
+from .data_cache import get_cache_key, load_cached_frame, save_cached_frame
 
 
 class EpiData:
     """
     A class designed for loading and initial processing of morbidity data
     """
-    def __init__(self, file_path, incidence, age_groups, strains):
+    def __init__(self, file_path, incidence, age_groups, strains, use_cache=True, aggregation=None):
+        """
+        :param use_cache (bool): load the aggregated data from the binary cache next to the data file,
+                                 the CSV file is parsed only when the file or the aggregation settings change
+        :param aggregation (IncidenceAggregation): already loaded data file, shared by the incidence types
+        """
         self.incidence = incidence
         self.age_groups = age_groups
         self.strains = strains
-        self.df_raw = self._get_epid_data(file_path)
+        if aggregation is not None:
+            self.df_raw = aggregation.view(incidence).dropna()
+        elif use_cache:
+            self.df_raw = self._get_cached_epid_data(file_path)
+        else:
+            self.df_raw = self._get_epid_data(file_path)
+        self.season_index = SeasonIndex(self.df_raw, incidence, age_groups)
+
+    def _get_cached_epid_data(self, file_path) -> pd.DataFrame:
+        key = get_cache_key(file_path, self.incidence, self.age_groups, self.strains)
+        df = load_cached_frame(file_path, key)
+        if df is None:
+            df = self._get_epid_data(file_path)
+            try:
+                save_cached_frame(file_path, key, df)
+            except OSError as e:  # e.g. read-only data directory
+                print(f"Input data cache is not saved: {e}")
+        return df
 
     def _get_epid_data(self, file_path) -> pd.DataFrame:
         """
         Initial data preprocessing
         returns (pandas.Dataframe) : aggregated dataframe without missing values
         """
-        data = pd.read_csv(file_path, index_col=0)
-        if self.incidence != 'strain_age-group':
-            agg_data = prevalenceType(self.incidence, data, self.age_groups, self.strains)
-            return agg_data.dropna()
-        return data.dropna()
+        aggregation = IncidenceAggregation.from_csv(file_path, self.age_groups, self.strains)
+        return aggregation.view(self.incidence).dropna()
 
     def incidence_for_season(self, first_year: int) -> pd.DataFrame:
         """
@@ -32,8 +53,7 @@ class EpiData:
         param: first_year (int): ARI start year
         returns (pandas.Dataframe) : extracted ARI period
         """
-        df = extractARIForSeason(self.df_raw, first_year)
-        return df
+        return self.season_index.season(first_year)
 
     def pop_size(self, year: int) -> int:
         """
@@ -41,7 +61,14 @@ class EpiData:
         param: year (int): provided year
         returns (int) : population size
         """
-        return extractPopSize(self.df_raw, year, self.incidence, self.age_groups)
+        return self.season_index.pop_size(year)
+
+    def seasons(self):
+        """
+        Iterates over all the seasons in the data
+        returns (Iterator[Season]) : season data with the population size
+        """
+        return self.season_index.seasons()
 
 
 def prepare_calibration_data(path: str, incidence: str, age_groups: List,
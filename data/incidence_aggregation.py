@@ -0,0 +1,91 @@
+import operator
+from functools import reduce
+from typing import List
+
+import pandas as pd
+
+POPULATION = 'Население'
+TOTAL = 'Все'
+INCIDENCE_TYPES = ('strain', 'age-group', 'total', 'strain_age-group')
+
+# measures of the raw data columns aggregated (and then dropped) for each incidence type
+CONSUMED_MEASURES = {
+    'strain': {'cases', 'rel', 'population'},
+    'age-group': {'cases', 'rel'},
+    'total': {'cases', 'rel', 'population'},
+    'strain_age-group': set(),
+}
+
+
+def _sum_columns(columns):
+    # left-to-right sum, NaN in any of the columns gives NaN
+    return reduce(operator.add, columns)
+
+
+class IncidenceAggregation:
+    """
+    Raw incidence data with the column names parsed once into a (strain, age group, measure) MultiIndex.
+    The data of every incidence type is a projection of this base frame, which is never changed
+    """
+    def __init__(self, raw_data: pd.DataFrame, age_groups: List[str], strains: List[str]):
+        """
+        :param raw_data (DataFrame): data with '<strain>_<age group>', '<strain>_<age group>_rel' and
+                                     'Население <age group>' columns, it is copied and not changed
+        """
+        self.age_groups = list(age_groups)
+        self.strains = list(strains)
+
+        parsed = {}
+        for strain in self.strains:
+            for age_group in self.age_groups:
+                parsed[strain + "_" + age_group] = (strain, age_group, 'cases')
+                parsed[strain + "_" + age_group + "_rel"] = (strain, age_group, 'rel')
+        for age_group in self.age_groups:
+            parsed[POPULATION + " " + age_group] = ('', age_group, 'population')
+        keys = [parsed.get(column, (column, '', 'other')) for column in raw_data.columns]
+
+        self.base = raw_data.copy()
+        self.base.columns = pd.MultiIndex.from_tuples(keys, names=['strain', 'age_group', 'measure'])
+        self._names = dict(zip(keys, raw_data.columns))
+
+    @classmethod
+    def from_csv(cls, file_path: str, age_groups: List[str], strains: List[str]) -> 'IncidenceAggregation':
+        return cls(pd.read_csv(file_path, index_col=0), age_groups, strains)
+
+    def cases(self, strain, age_group):
+        return self.base[(strain, age_group, 'cases')]
+
+    def population(self, age_group):
+        return self.base[('', age_group, 'population')]
+
+    def view(self, incidence: str) -> pd.DataFrame:
+        """
+        Data aggregated for the incidence type: the remaining raw columns in their order
+        followed by the aggregated incidence, population and relative incidence columns
+        """
+        if incidence not in CONSUMED_MEASURES:
+            raise ValueError(f"Unknown incidence type: {incidence}")
+
+        consumed = CONSUMED_MEASURES[incidence]
+        columns = {self._names[key]: self.base[key] for key in self.base.columns if key[2] not in consumed}
+
+        if incidence == 'strain':
+            for strain in self.strains:
+                columns[strain] = _sum_columns(self.cases(strain, age_group) for age_group in self.age_groups)
+            columns[POPULATION] = _sum_columns(self.population(age_group) for age_group in self.age_groups)
+            for strain in self.strains:
+                columns[strain + "_rel"] = columns[strain] * 1000 / columns[POPULATION]
+
+        elif incidence == 'age-group':
+            for age_group in self.age_groups:
+                columns[age_group] = _sum_columns(self.cases(strain, age_group) for strain in self.strains)
+            for age_group in self.age_groups:
+                columns[age_group + "_rel"] = columns[age_group] * 1000 / self.population(age_group)
+
+        elif incidence == 'total':
+            columns[TOTAL] = _sum_columns(self.cases(strain, age_group)
+                                          for strain in self.strains for age_group in self.age_groups)
+            columns[POPULATION] = _sum_columns(self.population(age_group) for age_group in self.age_groups)
+            columns[TOTAL + "_rel"] = columns[TOTAL] * 1000 / columns[POPULATION]
+
+        return pd.DataFrame(columns, index=self.base.index)
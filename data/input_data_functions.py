@@ -1,3 +1,5 @@
+from .incidence_aggregation import IncidenceAggregation
+
 
 WEEK_SEASON_START = 26
 WEEK_SEASON_END = 25
@@ -49,61 +51,5 @@ def extractARIForSeason(df, first_year):
 
 
 def prevalenceType(incidence, raw_data, age_groups, strains):
-    new_df = raw_data
-    if incidence == "strain":
-        # Strains
-        for strain in strains:
-            strain_acum = 0
-            for age_group in age_groups:
-                strain_acum += new_df[strain + "_" + age_group]
-                new_df.drop(strain + "_" + age_group, axis=1, inplace=True)
-                new_df.drop(strain + "_" + age_group + "_rel", axis=1, inplace=True)
-            new_df[strain] = strain_acum
-
-        # Population
-        strain_population = 0
-        for age_group in age_groups:
-            strain_population += new_df["Население " + age_group]
-            new_df.drop("Население " + age_group, axis=1, inplace=True)
-        new_df["Население"] = strain_population
-
-        # Rel incidence
-        for strain in strains:
-            new_df[strain + "_rel"] = new_df[strain] * 1000 / new_df["Население"]
-
-    elif incidence == "age-group":
-        # Age groups
-        for age_group in age_groups:
-            age_group_acum = 0
-            for strain in strains:
-                age_group_acum += new_df[strain + "_" + age_group]
-                new_df.drop(strain + "_" + age_group, axis=1, inplace=True)
-                new_df.drop(strain + "_" + age_group + "_rel", axis=1, inplace=True)
-            new_df[age_group] = age_group_acum
-
-        # Rel incidence
-        for age_group in age_groups:
-            new_df[age_group + "_rel"] = new_df[age_group] * 1000 / new_df["Население " + age_group]
-
-    elif incidence == "total":
-        # Cumulative incidence
-        strain_age_group_acum = 0
-        for strain in strains:
-            for age_group in age_groups:
-                strain_age_group_acum += new_df[strain + "_" + age_group]
-                new_df.drop(strain + "_" + age_group, axis=1, inplace=True)
-                new_df.drop(strain + "_" + age_group + "_rel", axis=1, inplace=True)
-        new_df["Все"] = strain_age_group_acum
-
-        # Population
-        total_population = 0
-        for age_group in age_groups:
-            total_population += new_df["Население " + age_group]
-            new_df.drop("Население " + age_group, axis=1, inplace=True)
-        new_df["Население"] = total_population
-
-        # Rel incidence
-        new_df["Все_rel"] = new_df["Все"] * 1000 / new_df["Население"]
-
-    return new_df
-
+    # aggregates the raw data for the incidence type, raw_data is not changed
+    return IncidenceAggregation(raw_data, age_groups, strains).view(incidence)
@@ -0,0 +1,72 @@
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Union
+
+import numpy as np
+import pandas as pd
+
+from .input_data_functions import WEEK_EPI_START, WEEK_EPI_END
+
+
+@dataclass(frozen=True)
+class Season:
+    """Weekly incidence data of an epidemic season starting in first_year"""
+    first_year: int
+    data: pd.DataFrame
+    pop_size: Union[float, List[float]]
+
+    def incidence_array(self, groups: List[str]) -> np.ndarray:
+        """returns (np.ndarray): (groups, weeks) incidence of the given data columns"""
+        return self.data[groups].to_numpy(dtype=float).T
+
+
+class SeasonIndex:
+    """
+    Row ranges of the epidemic seasons and population sizes of the years in an aggregated data frame,
+    built in a single pass, so that a season is extracted by slicing instead of filtering the frame
+    """
+    def __init__(self, df: pd.DataFrame, incidence: str, age_groups: List[str]):
+        self.df = df
+        self.incidence = incidence
+        self.age_groups = age_groups
+
+        years = df["Год"].to_numpy()
+        weeks = df["Неделя"].to_numpy()
+        # the season of a row is the year it starts in: weeks from 1 Oct belong to the current year,
+        # weeks until 1 May to the previous one
+        season_years = np.where(weeks >= WEEK_EPI_START, years, np.where(weeks <= WEEK_EPI_END, years - 1, np.nan))
+
+        self._rows: Dict[int, Union[slice, np.ndarray]] = {}
+        for first_year in np.unique(season_years[~np.isnan(season_years)]):
+            positions = np.flatnonzero(season_years == first_year)
+            if first_year == 2010:
+                positions = positions[1:]  # the first week of the 2010 season is dropped
+            contiguous = len(positions) > 0 and positions[-1] - positions[0] + 1 == len(positions)
+            self._rows[int(first_year)] = slice(positions[0], positions[-1] + 1) if contiguous else positions
+
+        _, first_rows = np.unique(years, return_index=True)
+        self._year_rows = {int(years[row]): int(row) for row in first_rows}
+
+    @property
+    def first_years(self) -> List[int]:
+        return sorted(self._rows)
+
+    def season(self, first_year: int) -> pd.DataFrame:
+        """Weekly data of the season starting in first_year, a slice of the frame if its rows are contiguous"""
+        rows = self._rows.get(first_year)
+        if rows is None:
+            return self.df.iloc[0:0]
+        return self.df.iloc[rows]
+
+    def pop_size(self, year: int):
+        """Population size (per age group for the age-group incidence types) in the first row of the year"""
+        row = self.df.iloc[self._year_rows[year]]
+        if self.incidence == "strain" or self.incidence == "total":
+            return float(row["Население"])
+        elif self.incidence == "strain_age-group" or self.incidence == "age-group":
+            return [row["Население " + age_group] for age_group in self.age_groups]
+
+    def seasons(self) -> Iterator[Season]:
+        """Iterates over the seasons with the population size of their first year"""
+        for first_year in self.first_years:
+            if first_year in self._year_rows:
+                yield Season(first_year, self.season(first_year), self.pop_size(first_year))
@@ -1,61 +1,147 @@
+import os
+import json
+import time
 import os.path as osp
 from datetime import datetime
 
 from utils.experiment_setup import ExperimentalSetup
+from optimizers.objective_cache import ObjectiveCache
+from optimizers.event_sink import EventSink
+from optimizers.profiler import StageProfiler
 from data.data_preprocessing import get_contact_matrix, prepare_calibration_data
+from utils.utils import get_config, save_results, EVENTS_FILE, PROFILE_FILE, CPROFILE_FILE
+from utils.result_store import ResultStore
 
-from visualization.visualization import plot_fitting
-from utils.utils import get_config, save_results
 
+def get_incidence_type(config):
+    incidence = config['INCIDENCE_TYPE']
+    # data will be grouped if model is grouped (GMDD and DMGD will be run as GMGD)
+    if not config['DATA_DETAIL'] or not config['MODEL_DETAIL']:
+        incidence = 'total'
+    return incidence
 
-def main():
-    config = get_config('config.yaml')
 
-    path = config['data_path']
-    exposure_year = config['year']
-    contact_matrix_path = config['contact_matrix_path']
-    mu = config['percent_protected']
-    sigma = config['sigma']
+def load_contact_matrix(config, incidence):
+    return get_contact_matrix(config['contact_matrix_path']) \
+        if incidence not in ['strain', 'total'] else [[6.528]]
 
+
+def configure_optimizer(optimizer, config, checkpoint_name, processes=None, events_path=None):
+    """
+    Sets the calibration settings of the optimizer from the config
+    :param checkpoint_name (str): checkpoint directory name of the calibrated outbreak
+    :param processes (int): worker processes of the optimizer, PROCESSES from the config by default
+    :param events_path (str): JSON lines file of the calibration events, used if EVENTS is set in the config
+    """
+    optimizer.peak_offset_range = tuple(config.get('PEAK_OFFSET_RANGE', [0, 1]))
+    optimizer.warm_start = config.get('WARM_START', 'anneal')
+    optimizer.screening_samples = config.get('SCREENING_SAMPLES', 2048)
+    optimizer.screening_top_k = config.get('SCREENING_TOP_K', 3)
+    optimizer.local_method = config.get('LOCAL_METHOD', 'Nelder-Mead')
+    optimizer.local_maxiter = config.get('LOCAL_MAXITER')
+    optimizer.model.dtype = config.get('SIMULATION_DTYPE', 'float64')
+    optimizer.anneal_population = config.get('ANNEAL_POPULATION', 0)
+    optimizer.processes = processes or config.get('PROCESSES') or max(os.cpu_count() - 1, 1)
+    optimizer.chains = config.get('CHAINS', 1)
+    if not isinstance(optimizer.chains, int) or optimizer.chains < 1:
+        raise ValueError(f"CHAINS must be a positive integer, got {optimizer.chains!r}")
+    optimizer.seed = config.get('SEED')
+    optimizer.objective_cache = ObjectiveCache(config.get('OBJECTIVE_CACHE_SIZE', 4096),
+                                               config.get('OBJECTIVE_CACHE_DECIMALS', 10),
+                                               config.get('OBJECTIVE_CACHE_PATH'))
+    optimizer.events = EventSink(events_path if config.get('EVENTS', False) else None,
+                                 verbosity=config.get('VERBOSITY', 1),
+                                 every=config.get('EVENTS_EVERY', 1))
+    optimizer.profiler = StageProfiler(config.get('PROFILE', False))
+    if config.get('CHECKPOINT', False):
+        optimizer.checkpoint_dir = osp.join(config['output_folder'], 'checkpoints', checkpoint_name)
+        optimizer.checkpoint_interval = config.get('CHECKPOINT_INTERVAL', 60)
+
+
+def calibrate(config, epidemic_data, pop_size, contact_matrix, city_eng, exposure_year, incidence, mu, sigma,
+              full_path=None, processes=None):
+    """
+    Calibrates the model to one outbreak, saves the results and the fitting plot
+    :param full_path (str): results directory, a time-stamped one in the output folder by default
+    :param processes (int): worker processes of the optimizer
+    returns: calibrated parameters, results directory
+    """
     age_groups = config['age_groups']
     strains = config['strains']
-
     output_folder = config['output_folder']
-    city_eng = config['city']
     city = "_".join(city_eng.lower().split())
-
-    incidence = config['INCIDENCE_TYPE']
-    data_detail = config['DATA_DETAIL']
-    model_detail = config['MODEL_DETAIL']
+    model_detail = config['MODEL_DETAIL'] and incidence != 'total'
     predict = config['PREDICT']
 
-    # data will be grouped if model is grouped (GMDD and DMGD will be run as GMGD)
-    if not data_detail or not model_detail:
-        incidence = 'total'
-
-    contact_matrix = get_contact_matrix(contact_matrix_path) \
-        if incidence not in ['strain', 'total'] else [[6.528]]
-    epidemic_data, pop_size = prepare_calibration_data(path, incidence, age_groups, strains, exposure_year)
+    if full_path is None:
+        output_dir = osp.join(output_folder, 'data', incidence)
+        results_dir = f'{incidence}_{exposure_year}_{datetime.now().strftime("%Y_%m_%d_%H_%M")}_mu_{mu}_sigma_{sigma}'
+        full_path = osp.normpath(osp.join(output_dir, 'ysc_paper', results_dir))
 
     experiment_setter = ExperimentalSetup(incidence, age_groups, strains, contact_matrix, pop_size, mu, sigma)
     optimizer = experiment_setter.setup_experiment(epidemic_data, model_detail)
+    configure_optimizer(optimizer, config, f'{incidence}_{exposure_year}_{city}_mu_{mu}_sigma_{sigma}', processes,
+                        events_path=osp.join(full_path, EVENTS_FILE))
+
+    profile = None
+    if config.get('CPROFILE', False):
+        import cProfile
+        profile = cProfile.Profile()
+        profile.enable()
+    start = time.perf_counter()
+    opt_parameters = optimizer.fit_one_outbreak(predict, config.get('SAMPLE_SIZE'))
+    wall_time = time.perf_counter() - start
+    if profile is not None:
+        profile.disable()
+        os.makedirs(full_path, exist_ok=True)
+        profile.dump_stats(osp.join(full_path, CPROFILE_FILE))
 
-    opt_parameters = optimizer.fit_one_outbreak()
-
-    output_dir = osp.join(output_folder, 'data', incidence)
     model_fit = optimizer.df_simul_weekly.dropna(axis=1)
     incidence_data = optimizer.df_data_weekly.loc[:, model_fit.columns]
     calibration_data = optimizer.calib_data_weekly.loc[:, model_fit.columns]
     r_squared = optimizer.R_square_list
 
-    results_dir = f'{incidence}_{exposure_year}_{datetime.now().strftime("%Y_%m_%d_%H_%M")}_mu_{mu}_sigma_{sigma}'
-    full_path = osp.normpath(osp.join(output_dir, 'ysc_paper', results_dir))
-    save_results(opt_parameters, model_fit, calibration_data, incidence_data, full_path)
-
+    if config.get('SAVE_CSV', True):
+        save_results(opt_parameters, model_fit, calibration_data, incidence_data, full_path)
+    if config.get('RESULT_STORE'):
+        store = ResultStore(config['RESULT_STORE'])
+        store.save(opt_parameters, model_fit, calibration_data, incidence_data, incidence, exposure_year, city,
+                   mu, sigma, config=config, source=full_path)
+        store.close()
+    optimizer.clear_checkpoints()
+    if config.get('PROFILE', False):
+        os.makedirs(full_path, exist_ok=True)
+        with open(osp.join(full_path, PROFILE_FILE), 'w') as f:
+            json.dump(optimizer.profile_report(wall_time), f, indent=4)
+
+    from visualization.visualization import plot_fitting  # matplotlib is loaded only for plotting
+
+    os.makedirs(full_path, exist_ok=True)
     file_path_fitting = osp.join(full_path, f'fit_{incidence}_{city}_{exposure_year}.png')
     plot_fitting(incidence_data, calibration_data, model_fit, city_eng,
                  exposure_year, file_path_fitting, r_squared=r_squared, predict=predict)
 
+    return opt_parameters, full_path
+
+
+def main():
+    config = get_config('config.yaml')
+
+    path = config['data_path']
+    exposure_year = config['year']
+    mu = config['percent_protected']
+    sigma = config['sigma']
+
+    age_groups = config['age_groups']
+    strains = config['strains']
+    city_eng = config['city']
+
+    incidence = get_incidence_type(config)
+    contact_matrix = load_contact_matrix(config, incidence)
+    epidemic_data, pop_size = prepare_calibration_data(path, incidence, age_groups, strains, exposure_year)
+
+    calibrate(config, epidemic_data, pop_size, contact_matrix, city_eng, exposure_year, incidence, mu, sigma)
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,34 @@
+import numpy as np
+
+
+class SimulationBuffers:
+    """
+    Arrays reused by the consecutive simulations of a model: the state arrays and the work arrays of the daily
+    recurrence are allocated once per shape and dtype (e.g. for the single and the batched simulations)
+    The arrays returned by a simulation with buffers are overwritten by the next simulation of the same shape
+    """
+    def __init__(self):
+        self._arrays = {}
+        self.allocations = 0  # number of arrays allocated, constant in the steady state
+
+    def get(self, name, shape, dtype, zero=True):
+        """
+        :param name (str): buffer name
+        :param zero (bool): whether the buffer is zeroed, False if every element is written by the caller
+        returns (np.ndarray): buffer of the given shape and dtype
+        """
+        key = (name, tuple(shape), np.dtype(dtype))
+        array = self._arrays.get(key)
+        if array is None:
+            array = self._arrays[key] = np.zeros(shape, dtype=dtype)
+            self.allocations += 1
+        elif zero:
+            array.fill(0)
+        return array
+
+    def clear(self):
+        self._arrays.clear()
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self._arrays.values())
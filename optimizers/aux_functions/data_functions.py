@@ -81,3 +81,46 @@ def calculate_r_square(df_data_weekly, df_simul_weekly, groups, delta, weights):
     R_square_list = [1 - fun_val / res2 for fun_val, res2 in zip(dist2_list, res2_list)]
 
     return R_square_list
+
+
+def max_elem_indices_array(arr):
+    # returns the indices and the values of the highest incidence for each row (group) of an array
+    return arr.argmax(axis=1), arr.max(axis=1)
+
+
+def align_simulation(simul, delta, weeks_num):
+    # returns the part of the modeled curves compared with the data points shifted by delta,
+    # the points outside the simulated horizon are zeros
+
+    aligned = np.zeros((simul.shape[0], weeks_num))
+    start, stop = max(delta, 0), min(delta + weeks_num, simul.shape[1])
+    if start < stop:
+        aligned[:, start - delta:stop - delta] = simul[:, start:stop]
+    return aligned
+
+
+def calculate_dist_squared_weighted_array(data, simul, delta, w):
+    # data, w are (groups, weeks) arrays of real data and weights, simul is (groups, weeks) modeled curves
+
+    dist2_ww = (data - align_simulation(simul, delta, data.shape[1])) ** 2
+    return (w * dist2_ww).sum(axis=1), dist2_ww.sum(axis=1)
+
+
+def calculate_dist_squared_weighted_shifts(data, simul, deltas, w):
+    # weighted squared distances for every candidate shift of the modeled curves in one pass over
+    # the sliding windows of the zero-padded curves, returns (shifts, groups) arrays
+
+    weeks_num = data.shape[1]
+    pad_left = max(-int(deltas.min()), 0)
+    padded_len = max(int(deltas.max()) + weeks_num, simul.shape[1]) + pad_left
+    padded = np.zeros((simul.shape[0], padded_len))
+    padded[:, pad_left:pad_left + simul.shape[1]] = simul
+
+    aligned = np.lib.stride_tricks.sliding_window_view(padded, weeks_num, axis=1)[:, deltas + pad_left, :]
+    dist2_ww = (data[:, None, :] - aligned) ** 2
+    return (w[:, None, :] * dist2_ww).sum(axis=2).T, dist2_ww.sum(axis=2).T
+
+
+def find_residuals_weighted_array(data, w):
+    return (w * (data - data.mean(axis=1, keepdims=True)) ** 2).sum(axis=1)
+
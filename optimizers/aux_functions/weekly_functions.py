@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 
 
@@ -23,3 +24,20 @@ def getDays2Weeks(df_simul_daily, model_group):
         df_simul_weekly[subgroup] = simul_weekly
 
     return df_simul_weekly
+
+
+def days_to_weeks(simul_daily):
+    """
+    Sums daily incidence to weeks, incomplete last week is summed over its days
+    :param simul_daily (np.ndarray): (groups, days) array
+    returns (np.ndarray): (groups, weeks) array
+    """
+    days_num = simul_daily.shape[-1]
+    wks_num = days_num // 7
+    # summed in double precision for the single precision simulations
+    weekly_shape = simul_daily.shape[:-1] + (wks_num, 7)
+    simul_weekly = simul_daily[..., :wks_num * 7].reshape(weekly_shape).sum(axis=-1, dtype=float)
+    if days_num % 7:
+        last_week = simul_daily[..., wks_num * 7:].sum(axis=-1, dtype=float, keepdims=True)
+        simul_weekly = np.concatenate([simul_weekly, last_week], axis=-1)
+    return simul_weekly
@@ -1,18 +1,27 @@
 import os
+import json
+import random
+import time
+import shutil
+import os.path as osp
 from typing import Optional
 
 import numpy as np
 import pandas as pd
 from pandas import DataFrame
 
-from scipy.optimize import minimize
-from scipy.stats import qmc
-from sklearn.metrics import r2_score
-
-from functools import partial
 from multiprocessing import Pool
 
-from .simulated_annealing import InitValueFinder
+from models.simulation_buffers import SimulationBuffers
+
+# scipy and simanneal are imported by the optimization stages using them, so that simulation-only
+# code and pool workers do not load them
+from .calibration_context import CalibrationContext
+from .checkpoint import CalibrationCheckpoint, EvaluationLog
+from .objective_cache import ObjectiveCache, digest_key_parts
+from .event_sink import EventSink, PROGRESS
+from .profiler import StageProfiler
+from .calibration_task import CalibrationTask, TaskObjective, run_chain_task, init_energy_worker, worker_energy
 from .aux_functions import data_functions as dtf
 from .aux_functions import weekly_functions as weeklyf
 from .aux_functions import weights_for_data_functions as weights_for_data
@@ -33,6 +42,9 @@ class BaseOptimizer:
         :param predict (bool): flag to set prediction mode
         """
         self.model = model
+        # state and work arrays of the model reused across the evaluations, so the steady state does not allocate
+        self.simulation_buffers = SimulationBuffers()
+        self.model.buffers = self.simulation_buffers
 
         self.incidence_type = self.model.incidence_type
         self.a_detail = self.model.a_detail  # [legacy] should be changed in BR model manually for age-group case
@@ -48,6 +60,12 @@ class BaseOptimizer:
         self.df_simul_daily: Optional[DataFrame] = None
         self.df_simul_weekly: Optional[DataFrame] = None
 
+        # data-dependent part of the fit function, built once per calibration
+        self.calib_context: Optional[CalibrationContext] = None
+        # (groups, days) and (groups, weeks) model curves, the data frames above are built from them once
+        self.simul_daily: Optional[np.ndarray] = None
+        self.simul_weekly: Optional[np.ndarray] = None
+
         self.general_main_peak = []
         self.strains_num_opt = 0
         self.delta = 0
@@ -60,11 +78,36 @@ class BaseOptimizer:
         self.population_immunity = 0
         self.active_population = 0
         self.tpeak_bias_aux = 0
+        self.tpeak_candidates = None  # peak offsets scored at once by the fit function in the prediction mode
+        self.peak_offset_range = (0, 1)  # [left, right) range of the predicted peak offsets
 
         self.r0 = []
         self.bootstrap_mode = False
         self.sigma = sigma
 
+        self.anneal_population = 0  # candidate states per temperature step, 0 for sequential annealing
+        self.processes = 1  # worker processes used for the annealing population and calibration chains
+        self.chains = 1  # independent annealing + local search chains started from different points
+        self.seed = None  # seed the chain seeds are derived from
+        self.chain_results = []
+        self.param_ranges = None  # pr.set_parameters_range(incidence_type) by default
+
+        self.warm_start = 'anneal'  # initial points of the local search: 'anneal', 'lhs' or 'sobol' screening
+        self.screening_samples = 2048
+        self.screening_top_k = 3  # best screened points the local search is started from
+        self.screening_batch_size = 64  # points simulated at once
+        self.local_method = 'Nelder-Mead'  # or 'L-BFGS-B' with the gradient by batched finite differences
+        self.fd_step = 1e-7  # relative finite difference step
+        self.local_maxiter = None  # iterations of every local search, None for the scipy default
+
+        self.checkpoint_dir = None  # directory the calibration chains are checkpointed to, None to disable
+        self.checkpoint_interval = 60.0  # seconds
+        self.evaluations = 0  # model simulations run by the fit function
+        self.objective_cache = ObjectiveCache()
+        self.events = EventSink()  # progress and evaluation events of the calibration
+        self.profiler = StageProfiler()  # stage timers, disabled by default
+        self.stage = None  # calibration stage the fit function is evaluated in: 'anneal', 'screen', 'local', 'final'
+
     def _set_general_peak(self):
         """Calculates the greatest number of incidence cases and its index in the data set"""
         general_main_peak, _ = dtf.max_elem_indices(self.df_data_weekly, self.groups)
@@ -72,21 +115,43 @@ class BaseOptimizer:
 
     def _set_weekly_inc(self):
         """Converts data points of the model curve presented in days to weeks"""
-        self.df_simul_weekly = weeklyf.getDays2Weeks(self.df_simul_daily, self.groups)
+        self.simul_weekly = weeklyf.days_to_weeks(self.simul_daily)
+
+    def _extend_weekly_inc(self, weeks_num):
+        """Pads the weekly model curve with zeros if the comparison window goes beyond the simulated horizon"""
+        if len(self.df_simul_weekly) < weeks_num:
+            self.df_simul_weekly = self.df_simul_weekly.reindex(range(weeks_num), fill_value=0)
 
     def _get_data_weights(self, df, sigma):  # df, strains, age_group, incidence_type
         """Puts bigger weights to the data points that are closer to the peak"""
         return weights_for_data.getWeights4Data(df, self.groups, sigma)
 
-    def update_delta(self):
-        peak_indices_real, _ = dtf.max_elem_indices(self.df_data_weekly, self.groups)
-        peak_indices_model, peak_values_model = dtf.max_elem_indices(self.df_simul_weekly, self.groups)
-
-        peak_indices_model = [(peak_index + self.tpeak_bias_aux) for peak_index in peak_indices_model]
-        delta_list_prelim = [peak_index_model - peak_index_real
-                             for peak_index_model, peak_index_real in
-                             zip(peak_indices_model, peak_indices_real)]
-        self.delta = delta_list_prelim[dtf.max_elem_index(peak_values_model)]
+    def _set_calibration_context(self):
+        self.calib_context = CalibrationContext.from_data(self.df_data_weekly, self.calib_data_weekly,
+                                                          self.groups, self.data_weights)
+        self.reset_objective_cache()
+
+    def reset_objective_cache(self):
+        """Clears the fit function values, the on-disk ones are keyed on the data and the model configuration"""
+        ctx = self.calib_context
+        model_args, model_settings = self.get_model_config()
+        self.objective_cache.reset(ctx.data, ctx.calib_data, ctx.weights, ctx.calib_weights,
+                                   model_args, sorted(model_settings.items()), self.groups,
+                                   self.bootstrap_mode)
+
+    def get_peak_offsets(self):
+        """Peak offsets scored by the fit function: the prediction candidates or the fixed tpeak_bias_aux"""
+        if self.tpeak_candidates is not None:
+            return np.asarray(self.tpeak_candidates, dtype=int)
+        return np.array([self.tpeak_bias_aux])
+
+    def get_candidate_deltas(self, peak_offsets):
+        """Shifts of the model curve aligning its highest peak to the data peak, one per peak offset"""
+        peak_indices_real = self.calib_context.peak_indices
+        peak_indices_model, peak_values_model = dtf.max_elem_indices_array(self.simul_weekly)
+
+        delta_list_prelim = peak_indices_model - peak_indices_real
+        return int(delta_list_prelim[np.argmax(peak_values_model)]) + peak_offsets
 
     def update_data_alignment(self):
         """Updates index of the original data"""
@@ -100,45 +165,70 @@ class BaseOptimizer:
         self.calib_data_weekly.index = [item - list(self.calib_data_weekly.index)[0] for item in
                                         list(self.calib_data_weekly.index)]
 
+    def materialise_fit(self):
+        """Builds the data frames of the last model fit and aligns the data index to it"""
+        # the daily curve is a view of the simulation buffers overwritten by the next evaluation
+        self.simul_daily = self.simul_daily.copy()
+        self.df_simul_daily = pd.DataFrame(self.simul_daily.T, columns=self.groups)
+        self.df_simul_weekly = pd.DataFrame(self.simul_weekly.T, columns=self.groups)
+        # the saved model curve covers the simulated horizon followed by 1800 days without new cases
+        self._extend_weekly_inc(max(self.delta + len(self.df_data_weekly), (self.simul_daily.shape[-1] + 1800) // 7))
+
+        if not self.bootstrap_mode:
+            self.update_data_alignment()
+        else:
+            self.update_bootstrapped_data_alignment()
+
     def find_model_fit(self, exposed_list, lam_list, a):
         # Launching the simulation for a given parameter value and aligning the result to model
 
-        self.model.set_attributes()
-        self.model.init_simul_params(exposed_list, lam_list, a)
-        self.model.set_attributes()
-        infected_pop, self.population_immunity, self.active_population, self.r0 = self.model.make_simulation()
+        with self.profiler.stage('model_setup'):
+            self.model.set_attributes()
+            self.model.init_simul_params(exposed_list, lam_list, a)
+            self.model.set_attributes()
+        with self.profiler.stage('simulation'):
+            infected_pop, self.population_immunity, self.active_population, self.r0 = self.model.make_simulation()
+        return self.score_simulation(infected_pop)
+
+    def score_simulation(self, infected_pop):
+        """
+        Aligns the simulated incidence to the data and calculates the weighted distances
+        :param infected_pop (np.ndarray): new cases of shape (age_groups, strains, days)
+        returns (list): weighted squared distances per group
+        """
         inf_shape = infected_pop.shape
-        infected_pop = infected_pop.reshape(inf_shape[0] * inf_shape[1], inf_shape[2])
-        self.df_simul_daily = pd.DataFrame(infected_pop.T, columns=self.groups)
+        self.simul_daily = infected_pop.reshape(inf_shape[0] * inf_shape[1], inf_shape[2])
 
-        if self.df_simul_daily.max().max() == 1.0:
-            print("No epi dynamics")
+        if self.simul_daily.max() == 1.0:
+            self.events.emit('no_dynamics', "No epi dynamics", level=PROGRESS)
             return [999999999999] * len(self.groups)
 
-        df_extend = pd.DataFrame(0, index=np.arange(1800), columns=self.df_simul_daily.columns)
-        self.df_simul_daily = pd.concat([self.df_simul_daily, df_extend], ignore_index=True)
-
-        self._set_weekly_inc()
+        with self.profiler.stage('weekly_aggregation'):
+            self._set_weekly_inc()
+        ctx = self.calib_context
 
         if not self.bootstrap_mode:
-            self.update_delta()
-            self.update_data_alignment()  # data index update order changed [followed after R2 calc previously]
-
-            dist2_list, self.dist2_ww_list = \
-                dtf.calculate_dist_squared_weighted_list(self.calib_data_weekly, self.df_simul_weekly,
-                                                         self.groups, self.delta, self.data_weights)
-            self.R_square_list = dtf.calculate_r_square(self.calib_data_weekly, self.df_simul_weekly,
-                                                        self.groups, self.delta, self.data_weights)
+            # all the candidate peak offsets are scored on the same simulated curve, the best one is kept
+            with self.profiler.stage('alignment'):
+                peak_offsets = self.get_peak_offsets()
+                deltas = self.get_candidate_deltas(peak_offsets)
+            with self.profiler.stage('scoring'):
+                dist2, dist2_ww = dtf.calculate_dist_squared_weighted_shifts(ctx.calib_data, self.simul_weekly,
+                                                                             deltas, ctx.calib_weights)
+                best = int(np.argmin(dist2.sum(axis=1)))
+                self.tpeak_bias_aux, self.delta = int(peak_offsets[best]), int(deltas[best])
+                dist2, dist2_ww = dist2[best], dist2_ww[best]
+                R_square = 1 - dist2 / ctx.calib_res2
         else:
             self.delta = 0
-            self.update_bootstrapped_data_alignment()
-            dist2_list, self.dist2_ww_list = \
-                dtf.calculate_dist_squared_weighted_list(self.df_data_weekly, self.df_simul_weekly, self.groups,
-                                                         self.delta, self.data_weights)
+            with self.profiler.stage('scoring'):
+                dist2, dist2_ww = dtf.calculate_dist_squared_weighted_array(ctx.data, self.simul_weekly,
+                                                                            self.delta, ctx.weights)
+                R_square = 1 - dist2 / ctx.res2
 
-            self.R_square_list = [1 - fun_val / res2 for fun_val, res2 in zip(dist2_list, self.res2_list)]
-
-        print(" R2: ", self.R_square_list)
+        self.dist2_ww_list = dist2_ww.tolist()
+        self.R_square_list = R_square.tolist()
+        dist2_list = dist2.tolist()
 
         '''R_square_plain = dtf.calculate_r_square(self.calib_data_weekly, self.df_simul_weekly,
                                                 self.groups, self.delta, self._get_data_weights(self.df_data_weekly,
@@ -147,81 +237,439 @@ class BaseOptimizer:
 
         return dist2_list
 
-    def fit_function(self, k):
+    def unpack_parameters(self, k):
+        """
+        Converts the vector of calibrated parameters to the model parameters
+        returns: exposed_list, lam_list, a
+        """
         raise NotImplementedError
 
+    def fit_function(self, k):
+        peak_offsets = tuple(self.get_peak_offsets().tolist())
+        dist2 = self.objective_cache.get(k, peak_offsets)
+        if dist2 is None:
+            dist2 = self.compute_fit_function(k)
+            self.objective_cache.put(k, peak_offsets, dist2)
+        return dist2
+
+    def compute_fit_function(self, k):
+        """Fit function bypassing the cache, the fit attributes (delta, R2, model curves) are updated"""
+        self.evaluations += 1
+        start = time.perf_counter()
+        exposed_list, lam_list, a = self.unpack_parameters(k)
+        dist2_list = self.find_model_fit(exposed_list, lam_list, a)
+        dist2 = sum(dist2_list)
+        self.events.evaluation(self.stage, dist2, self.R_square_list, time.perf_counter() - start)
+
+        return dist2
+
+    def fit_function_batch(self, K, cached=True):
+        """
+        Evaluates the fit function for several parameter vectors with a single batched simulation
+        :param K (np.ndarray): parameter vectors of shape (batch_size, parameters_num)
+        :param cached (bool or np.ndarray): whether the values are looked up in and stored to the objective cache,
+                                            for all the vectors or per vector
+        returns (np.ndarray): fit function values of shape (batch_size,)
+        """
+        peak_offsets = tuple(self.get_peak_offsets().tolist())
+        cached = np.broadcast_to(cached, len(K))
+        values = np.array([self.objective_cache.get(k, peak_offsets) if use_cache else None
+                           for k, use_cache in zip(K, cached)], dtype=float)
+        missed = np.flatnonzero(np.isnan(values))
+        if len(missed) == 0:
+            return values
+
+        self.evaluations += len(missed)
+        start = time.perf_counter()
+        with self.profiler.stage('model_setup'):
+            exposed_batch, lam_batch, a_batch = zip(*[self.unpack_parameters(K[i]) for i in missed])
+            self.model.set_attributes()
+        with self.profiler.stage('simulation'):
+            infected_pop_batch = self.model.simulate_batch(exposed_batch, lam_batch, a_batch)
+        elapsed = (time.perf_counter() - start) / len(missed)  # the simulation time is shared by the batch
+        for i, infected_pop in zip(missed, infected_pop_batch):
+            values[i] = sum(self.score_simulation(infected_pop))
+            if cached[i]:
+                self.objective_cache.put(K[i], peak_offsets, values[i])
+            self.events.evaluation(self.stage, float(values[i]), self.R_square_list, elapsed)
+        return values
+
     def calculate_population_immunity(self, exposed_list, a):
         raise NotImplementedError
 
     def init_parameters(self):
-        param_ranges = pr.set_parameters_range(self.incidence_type)
+        param_ranges = self.param_ranges or pr.set_parameters_range(self.incidence_type)
         init_params = np.zeros(len(param_ranges))
         for i, param_range in enumerate(param_ranges):
-            init_params[i] = np.random.uniform(*param_range, 1)
+            init_params[i] = np.random.uniform(*param_range)
         return init_params, param_ranges
 
-    def optimize(self, param_init, param_range, tpeak_bias_aux_cur):
+    def optimize(self, param_init, param_range, tpeak_bias_aux_cur, checkpoint=None, saved_state=None):
+        """
+        Warm start (annealing or screening) for the initial points followed by the local search
+        :param checkpoint (CalibrationCheckpoint): checkpoint the chain state is periodically saved to
+        :param saved_state (dict): chain state loaded from the checkpoint to resume from
+        """
         self.tpeak_bias_aux = tpeak_bias_aux_cur
+        if saved_state is None or saved_state['stage'] == 'anneal':
+            with self.profiler.stage('warm_start'):
+                initial_states = self.find_initial_states(param_init, param_range, checkpoint, saved_state)
+            saved_state = None
+            if checkpoint is not None:
+                checkpoint.save('local', initial_states=initial_states, local_results=[], evaluations_log=None,
+                                evaluations=self.evaluations)
+        else:
+            initial_states = saved_state['initial_states']
+        self.events.emit('initial_states', f"Initial state: {initial_states[0]}", states=initial_states.tolist())
+
+        with self.profiler.stage('local_search'):
+            optim_result = self.refine(initial_states, param_range, checkpoint, saved_state)
+        return self, optim_result
+
+    def find_initial_states(self, param_init, param_range, checkpoint=None, saved_state=None):
+        """
+        Warm start of the local search
+        returns (np.ndarray): initial states of shape (states_num, parameters_num)
+        """
+        if self.warm_start in ('lhs', 'sobol'):
+            self.stage = 'screen'
+            states, _ = self.screen(param_range)
+            return states
+        if self.warm_start != 'anneal':
+            raise ValueError(f"Unknown warm start method: {self.warm_start}")
+        from .simulated_annealing import InitValueFinder
+
+        self.stage = 'anneal'
+        energy_func, batch_energy_func = self.fit_function, self.fit_function_batch
+        if self.anneal_population > 0 and self.processes > 1:
+            # workers receive the calibration task instead of the optimizer
+            objective = TaskObjective(self.make_task(param_ranges=param_range), self)
+            energy_func, batch_energy_func = objective, objective.batch
         initFinderObj = InitValueFinder(param_init,
                                         param_range,
-                                        self.model.history_states,
-                                        self.age_groups,
-                                        self.incidence_type,
-                                        self.a_detail,
-                                        self.find_model_fit)
-        print("Assessing the best initial point, this might take some time...")
+                                        energy_func,
+                                        batch_energy_func,
+                                        population=self.anneal_population,
+                                        processes=self.processes,
+                                        checkpoint=checkpoint,
+                                        events=self.events)
+        if saved_state is not None:
+            initFinderObj.resume(saved_state['anneal'])
+        self.events.emit('stage', "Assessing the best initial point, this might take some time...", stage='anneal')
         state, e = initFinderObj.anneal()
-        print("Initial state: ", state)
-        optim_result = minimize(self.fit_function, state, method='Nelder-Mead', bounds=param_range)  # SLSQP, L-BFGS-B
+        self.events.emit('anneal_done', f"Annealing energy: {e}", energy=e, state=np.asarray(state).tolist())
+        return np.atleast_2d(np.asarray(state, dtype=float))
 
-        return self, optim_result
+    def screen(self, param_range):
+        """
+        Evaluates a Latin hypercube or Sobol sample of the parameter ranges in batched chunks,
+        split across the worker processes
+        returns: best screening_top_k states of shape (k, parameters_num), their fit function values
+        """
+        from scipy.stats import qmc
 
-    def optimize_lhs(self):
-        sampler = qmc.LatinHypercube(d=7)
-        sampled_params = sampler.random(n=10000)
-        l_bounds = [0.1, 0.1, 0.1, 0.06, 0.07, 0.06, 0.05]
-        u_bounds = [0.4, 0.4, 0.4, 1.0, 1.0, 1.0, 1.0]
-        sampled_params = qmc.scale(sampled_params, l_bounds, u_bounds)
-        # result = qmc.discrepancy(sampled_params)
-        min_distance = 10e30
-        opt_params = []
-        for params in sampled_params:
-            distance = self.fit_function(params)
-            if distance < min_distance:
-                min_distance = distance
-                opt_params = params.tolist()
-        return opt_params, min_distance
+        lower, upper = np.asarray(param_range, dtype=float).T
+        sampler_seed = np.random.randint(2 ** 32 - 1)  # reproducible for a given chain seed
+        if self.warm_start == 'sobol':
+            sampler = qmc.Sobol(d=len(param_range), seed=sampler_seed)
+            samples = sampler.random_base2(m=int(np.ceil(np.log2(self.screening_samples))))
+        else:
+            sampler = qmc.LatinHypercube(d=len(param_range), seed=sampler_seed)
+            samples = sampler.random(n=self.screening_samples)
+        samples = qmc.scale(samples, lower, upper)
+
+        chunks = [samples[i:i + self.screening_batch_size]
+                  for i in range(0, len(samples), self.screening_batch_size)]
+        self.events.emit('stage', f"Screening {len(samples)} points ({self.warm_start}), this might take some time...",
+                         stage='screen', samples=len(samples), method=self.warm_start)
+        if self.processes > 1:
+            objective = TaskObjective(self.make_task(param_ranges=param_range), self)
+            with Pool(processes=self.processes, initializer=init_energy_worker,
+                      initargs=(objective, objective.batch)) as pool:
+                values = np.concatenate(pool.map(worker_energy, chunks))
+        else:
+            values = np.concatenate([self.fit_function_batch(chunk) for chunk in chunks])
 
-    def run_prediction(self):
-        initial_param_values, param_range = self.init_parameters()
-        peak_boundary_left = 0  # manually defined
-        peak_boundary_right = 1
+        best = np.argsort(values, kind='stable')[:self.screening_top_k]
+        self.events.emit('screen_done', f"Best screening values: {values[best].tolist()}", values=values[best].tolist())
+        return samples[best], values[best]
 
-        tpeaks = [peak for peak in range(peak_boundary_left, peak_boundary_right)]
-        anneal_func_with_params = partial(self.optimize, initial_param_values, param_range)
+    def refine(self, initial_states, param_range, checkpoint=None, saved_state=None):
+        """
+        Local search from every initial state, the best result is returned
+        :param saved_state (dict): 'local' stage state to resume the interrupted searches from
+        """
+        if self.local_method not in ('Nelder-Mead', 'L-BFGS-B'):
+            raise ValueError(f"Unknown local search method: {self.local_method}")
+        from scipy.optimize import minimize
+        use_gradient = self.local_method == 'L-BFGS-B'
+        self.stage = 'local'
+        self.events.emit('stage', None, stage='local', method=self.local_method, starts=len(initial_states))
+
+        local_results = list(saved_state['local_results']) if saved_state is not None else []
+        recorded = saved_state.get('evaluations_log') if saved_state is not None else None
+        for state in initial_states[len(local_results):]:
+            options = {} if self.local_maxiter is None else {'maxiter': self.local_maxiter}
+            local_fit_function = self.fit_function_and_gradient if use_gradient else self.fit_function
+            if checkpoint is not None:
+                local_fit_function = self._get_checkpointed_fit_function(local_fit_function, checkpoint,
+                                                                         initial_states, local_results,
+                                                                         recorded, use_gradient)
+            recorded = None  # the recorded evaluations belong to the first interrupted search only
+            local_results.append(minimize(local_fit_function, state, args=(param_range,) if use_gradient else (),
+                                          method=self.local_method, jac=use_gradient or None,
+                                          bounds=param_range, options=options))
+            self.events.emit('local_done', None, energy=float(local_results[-1].fun), nfev=int(local_results[-1].nfev))
+            if checkpoint is not None:
+                checkpoint.save('local', initial_states=initial_states, local_results=local_results,
+                                evaluations_log=None, evaluations=self.evaluations)
+
+        return min(local_results, key=lambda result: result.fun)
+
+    def fit_function_and_gradient(self, k, param_range=None):
+        """
+        Fit function with its gradient by forward differences: the shifted parameter vectors are
+        simulated in a single batch, steps going beyond the upper range bounds are taken backwards.
+        The shifted vectors bypass the objective cache, whose rounded keys could match the base point
+        for steps below the rounding precision
+        :param param_range (list[tuple]): parameter ranges
+        returns: fit function value, gradient
+        """
+        k = np.asarray(k, dtype=float)
+        steps = self.fd_step * np.maximum(np.abs(k), 1.0)
+        if param_range is not None:
+            upper = np.asarray(param_range, dtype=float)[:, 1]
+            steps = np.where(k + steps > upper, -steps, steps)
+
+        cached = np.arange(len(k) + 1) == 0
+        values = self.fit_function_batch(np.vstack([k, k + np.diag(steps)]), cached)
+        return values[0], (values[1:] - values[0]) / steps
+
+    def _get_checkpointed_fit_function(self, fit_function, checkpoint, initial_states, local_results,
+                                       recorded=None, use_gradient=False):
+        """
+        Fit function of the local search saving its evaluations to the checkpoint, the evaluations
+        recorded by the interrupted search are replayed (see EvaluationLog)
+        :param recorded (list): evaluations log of the interrupted search
+        """
+        log = EvaluationLog(recorded)
+        peak_offsets = tuple(self.get_peak_offsets().tolist())
+
+        def checkpointed_fit_function(k, *args):
+            result = log.replay(k)
+            if result is None:
+                result = fit_function(k, *args)
+            else:
+                # the objective cache is filled as by the interrupted search
+                self.objective_cache.put(k, peak_offsets, result[0] if use_gradient else result)
+            log.add(k, result)
+            if checkpoint.due():
+                checkpoint.save('local', initial_states=initial_states, local_results=local_results,
+                                evaluations_log=log.evaluations, evaluations=self.evaluations)
+            return result
+
+        return checkpointed_fit_function
+
+    def make_task(self, tpeak_bias_aux=None, seed=None, param_ranges=None):
+        """
+        Builds a compact immutable description of the calibration for worker processes
+        returns (CalibrationTask)
+        """
+        model_args, model_settings = self.get_model_config()
+        param_ranges = param_ranges or self.param_ranges or pr.set_parameters_range(self.incidence_type)
+
+        return CalibrationTask(model_cls=type(self.model),
+                               model_args=model_args,
+                               model_settings=model_settings,
+                               optimizer_cls=type(self),
+                               groups=tuple(self.groups),
+                               sigma=self.sigma,
+                               calib_context=self.calib_context,
+                               param_ranges=tuple(tuple(param_range) for param_range in param_ranges),
+                               tpeak_bias_aux=self.tpeak_bias_aux if tpeak_bias_aux is None else tpeak_bias_aux,
+                               tpeak_candidates=self.tpeak_candidates,
+                               seed=seed,
+                               anneal_population=self.anneal_population,
+                               warm_start=self.warm_start,
+                               screening_samples=self.screening_samples,
+                               screening_top_k=self.screening_top_k,
+                               screening_batch_size=self.screening_batch_size,
+                               local_method=self.local_method,
+                               fd_step=self.fd_step,
+                               local_maxiter=self.local_maxiter,
+                               bootstrap_mode=self.bootstrap_mode,
+                               checkpoint_dir=self.checkpoint_dir,
+                               checkpoint_interval=self.checkpoint_interval,
+                               stage=self.stage,
+                               cache_settings=self.objective_cache.settings(),
+                               event_settings=self.events.settings(),
+                               profile_settings=self.profiler.settings())
+
+    def get_model_config(self):
+        """
+        returns: model constructor arguments, model attributes changed after construction
+        """
+        model = self.model
+        model_args = (model.M, model.pop_size, model.mu, model.incidence_type,
+                      list(model.age_groups), list(model.strains))
+        model_settings = {'engine': model.engine, 'N': model.N, 'seeding': list(model.seeding),
+                          'extinction_tol': model.extinction_tol, 'a_detail': model.a_detail, 'dtype': model.dtype}
+        return model_args, model_settings
 
-        with Pool(processes=os.cpu_count() - 1) as pool:
-            results = pool.map_async(anneal_func_with_params, tpeaks)
-            pool.close()
-            pool.join()
+    def run_prediction(self):
+        """
+        Calibration with the peak offset as a free parameter: every candidate offset in peak_offset_range
+        is scored on each simulated curve, so a single calibration finds the best offset
+        """
+        self.tpeak_candidates = tuple(range(*self.peak_offset_range))
+        if self.chains > 1:
+            return self.run_multistart()
+        return self.run_calibration()
 
-        opt_results = list(results.get())
+    def run_calibration(self):
+        _, opt_result = self.run_chain(self.get_chain_seeds()[0])
+        opt_params = list(opt_result.x)  # final bunch of optimal values
+        return opt_result, opt_params
 
-        # getting optimal result from the sorted list of derived results in ascending order
-        opt_result = sorted(opt_results, key=lambda x: x[1].fun)[0]
-        optimizer_instance = opt_result[0]
-        opt_params = opt_result[1].x
+    def get_chain_seeds(self):
+        """Derives a reproducible seed for every calibration chain from the optimizer seed"""
+        if not isinstance(self.chains, int) or self.chains < 1:
+            raise ValueError(f"Number of calibration chains must be a positive integer, got {self.chains!r}")
+        return [int(seq.generate_state(1)[0]) for seq in np.random.SeedSequence(self.seed).spawn(self.chains)]
 
-        for k, v in optimizer_instance.__dict__.items():
-            self.__dict__[k] = v
+    def run_chain(self, seed):
+        """
+        Runs one annealing + local search chain from a random initial point
+        :param seed (int): seed of the chain
+        returns: seed, optimization result
+        """
+        checkpoint = self.get_checkpoint(seed)
+        saved_state = checkpoint.load() if checkpoint is not None else None
+        if saved_state is not None and not checkpoint.matches(saved_state):
+            self.events.emit('checkpoint_discarded',
+                             f"Checkpoint of the chain with seed {seed} was saved for another calibration setup "
+                             f"and is discarded", seed=seed)
+            saved_state = None
+        if saved_state is not None and saved_state['stage'] == 'done':
+            self.events.emit('chain_restored', f"Chain with seed {seed} is restored from the checkpoint", seed=seed)
+            return seed, saved_state['result']
+
+        np.random.seed(seed)
+        random.seed(seed)
+        initial_param_values, param_ranges = self.init_parameters()
+        if saved_state is not None:
+            self.events.emit('chain_resumed',
+                             f"Chain with seed {seed} is resumed from the '{saved_state['stage']}' stage",
+                             seed=seed, stage=saved_state['stage'])
+            CalibrationCheckpoint.restore_random_state(saved_state)
+            self.evaluations = saved_state.get('evaluations', saved_state.get('anneal', {}).get('evaluations', 0))
+
+        _, opt_result = self.optimize(initial_param_values, param_ranges, self.tpeak_bias_aux,
+                                      checkpoint=checkpoint, saved_state=saved_state)
+        if checkpoint is not None:
+            checkpoint.save('done', result=opt_result, evaluations=self.evaluations)
+        return seed, opt_result
+
+    def get_checkpoint(self, seed):
+        if self.checkpoint_dir is None:
+            return None
+        return CalibrationCheckpoint(osp.join(self.checkpoint_dir, f'chain_{seed}.pkl'), self.checkpoint_interval,
+                                     self.checkpoint_key())
+
+    def checkpoint_key(self):
+        """
+        Digest of the data and the settings a calibration chain depends on, so that the checkpoints saved
+        for another setup under the same checkpoint directory (e.g. another data file, age groups,
+        warm start or local search settings) are not resumed
+        """
+        ctx = self.calib_context
+        model_args, model_settings = self.get_model_config()
+        param_ranges = self.param_ranges or pr.set_parameters_range(self.incidence_type)
+        return digest_key_parts(ctx.data, ctx.calib_data, ctx.weights, ctx.calib_weights,
+                                model_args, sorted(model_settings.items()), self.groups, self.bootstrap_mode,
+                                [tuple(param_range) for param_range in param_ranges],
+                                tuple(self.get_peak_offsets().tolist()), self.anneal_population, self.warm_start,
+                                self.screening_samples, self.screening_top_k, self.screening_batch_size,
+                                self.local_method, self.fd_step, self.local_maxiter)
+
+    def init_seed(self):
+        """
+        Sets a random seed if none is given; with checkpointing enabled, the seed of the
+        interrupted run is reused, so that the chains are resumed. The checkpoints of an interrupted run
+        with another calibration setup are removed
+        """
+        seed_path = osp.join(self.checkpoint_dir, 'seed.json') if self.checkpoint_dir is not None else None
+        key = self.checkpoint_key() if seed_path is not None else None
+        if seed_path is not None and osp.exists(seed_path):
+            with open(seed_path, 'r') as f:
+                saved = json.load(f)
+            if saved.get('key') != key:
+                self.events.emit('checkpoints_discarded',
+                                 f"Checkpoints in {self.checkpoint_dir} were saved for another calibration setup "
+                                 f"and are removed", checkpoint_dir=self.checkpoint_dir)
+                self.clear_checkpoints()
+            elif self.seed is None:
+                self.seed = saved['seed']
+        if self.seed is None:
+            self.seed = int(np.random.SeedSequence().generate_state(1)[0])
+        if seed_path is not None:
+            os.makedirs(self.checkpoint_dir, exist_ok=True)
+            with open(seed_path, 'w') as f:
+                json.dump({'seed': self.seed, 'key': key}, f)
+
+    def clear_checkpoints(self):
+        """Removes the checkpoints after the results are saved"""
+        if self.checkpoint_dir is not None and osp.isdir(self.checkpoint_dir):
+            shutil.rmtree(self.checkpoint_dir)
+
+    def run_multistart(self):
+        """
+        Runs independent calibration chains across a process pool and picks the global optimum,
+        the results are collected as soon as each chain finishes
+        """
+        tasks = [self.make_task(seed=seed) for seed in self.get_chain_seeds()]
+        self.chain_results = []
+        opt_result = None
+
+        processes = min(self.processes, self.chains)
+        if processes > 1:
+            with Pool(processes=processes) as pool:
+                for chain_result in pool.imap_unordered(run_chain_task, tasks):
+                    opt_result = self._collect_chain_result(chain_result, opt_result)
+        else:
+            for chain_result in map(run_chain_task, tasks):
+                opt_result = self._collect_chain_result(chain_result, opt_result)
 
+        opt_params = list(opt_result.x)
         return opt_result, opt_params
 
-    def run_calibration(self):
-        initial_param_values, param_ranges = self.init_parameters()
-        _, opt_result = self.optimize(initial_param_values, param_ranges, self.tpeak_bias_aux)
-        opt_params = list(opt_result.x)  # final bunch of optimal values
-        return opt_result, opt_params
+    def _collect_chain_result(self, chain_result, opt_result):
+        self.chain_results.append(chain_result)
+        self.profiler.add(chain_result.profile)
+        self.events.emit('chain_done', f"Chain {len(self.chain_results)}/{self.chains} (seed {chain_result.seed}) "
+                                       f"finished: {chain_result.fun}, R2: {list(chain_result.R2)}",
+                         seed=chain_result.seed, energy=chain_result.fun, R2=list(chain_result.R2),
+                         nfev=chain_result.nfev)
+        if opt_result is None or chain_result.fun < opt_result.fun:
+            return chain_result
+        return opt_result
+
+    def report_objective_cache(self):
+        """Reports the cache statistics of this process and of the calibration chains"""
+        stats = self.objective_cache.stats()
+        for chain_result in self.chain_results:
+            for name, value in chain_result.cache_stats.items():
+                stats[name] = stats.get(name, 0) + value
+        lookups = stats['hits'] + stats['disk_hits'] + stats['misses']
+        hit_rate = (stats['hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        self.events.emit('objective_cache', f"Objective cache: {stats['hits']} hits, {stats['disk_hits']} disk hits, "
+                                            f"{stats['misses']} misses ({100 * hit_rate:.1f}% hit rate)",
+                         hit_rate=hit_rate, **stats)
+
+    def profile_report(self, wall_time=None):
+        """Stage timings of the calibration, including the chains run in worker processes"""
+        evaluations = self.evaluations + sum(chain_result.evaluations for chain_result in self.chain_results)
+        return self.profiler.report(evaluations, wall_time)
 
     def fit_one_outbreak(self, predict=False, sample_size=None, bootstrap_mode=False):
         """
@@ -229,19 +677,26 @@ class BaseOptimizer:
         """
         self.calib_data_weekly = self.df_data_weekly[:sample_size]
         self.data_weights = self._get_data_weights(self.df_data_weekly, self.sigma)
-        self.res2_list = dtf.find_residuals_weighted_list(self.df_data_weekly, self.groups, self.data_weights)
+        self._set_calibration_context()
+        self.res2_list = self.calib_context.res2.tolist()
+        self.init_seed()
 
+        self.tpeak_candidates = None
         if predict:
             opt_result, opt_params = self.run_prediction()
-            opt_result_fun = opt_result[1].fun
-
-            print("Values of optimized fit function: ", opt_result_fun)
-            print("Optimal predicted peak index: ", self.tpeak_bias_aux)
-
+        elif self.chains > 1:
+            opt_result, opt_params = self.run_multistart()
         else:
             opt_result, opt_params = self.run_calibration()
-            # opt_params, opt_distance = self.optimize_lhs()
-            # print("Optimal distance: ", opt_distance)
+
+        self.stage = 'final'
+        self.compute_fit_function(opt_params)
+        self.materialise_fit()
+        if predict:
+            self.events.emit('prediction', f"Values of optimized fit function: {opt_result.fun}\n"
+                                           f"Optimal predicted peak index: {self.tpeak_bias_aux}",
+                             energy=float(opt_result.fun), tpeak_bias_aux=self.tpeak_bias_aux)
+        self.report_objective_cache()
 
         exposed_opt_list, lambda_opt_list, a_opt = pr.get_opt_params(opt_params,
                                                                      self.incidence_type,
@@ -254,13 +709,13 @@ class BaseOptimizer:
                        'a': a_opt,
                        'delta': self.delta,
                        'total_recovered': total_recovered,
-                       'R2': self.R_square_list}
-
-        print("Final optimal parameters: ")
-        print("exposed: ", exposed_opt_list)
-        print("lambda: ", lambda_opt_list)
-        print("a: ", a_opt)
-        print("R2: ", self.R_square_list)
-        print("Recovered: ", total_recovered)
+                       'R2': self.R_square_list,
+                       'seed': self.seed}
+
+        self.events.emit('result', f"Final optimal parameters: \nexposed: {exposed_opt_list}\n"
+                                   f"lambda: {lambda_opt_list}\na: {a_opt}\nR2: {self.R_square_list}\n"
+                                   f"Recovered: {total_recovered}",
+                         evaluations=self.evaluations, **epid_params)
+        self.events.flush()
 
         return epid_params
@@ -0,0 +1,55 @@
+from dataclasses import dataclass
+from typing import List, Dict
+
+import numpy as np
+from pandas import DataFrame
+
+from .aux_functions import data_functions as dtf
+
+
+def _frozen_array(values):
+    array = np.ascontiguousarray(values, dtype=float)
+    array.setflags(write=False)
+    return array
+
+
+@dataclass(frozen=True)
+class CalibrationContext:
+    """
+    Quantities of the fit function that depend only on the data, computed once per calibration.
+    All the arrays are read-only and have the groups as the first dimension
+    """
+    groups: tuple
+    data: np.ndarray  # (groups, weeks) incidence data
+    calib_data: np.ndarray  # (groups, calibration weeks) part of the data used for calibration
+    weights: np.ndarray  # (groups, weeks) weights of the data points
+    calib_weights: np.ndarray  # (groups, calibration weeks)
+    res2: np.ndarray  # weighted residual sums of squares of the data
+    calib_res2: np.ndarray  # weighted residual sums of squares of the calibration data
+    peak_indices: np.ndarray  # indices of the highest incidence in the data
+    peak_values: np.ndarray
+
+    @classmethod
+    def from_data(cls, df_data: DataFrame, df_calib: DataFrame,
+                  groups: List[str], weights: Dict[str, List[float]]) -> 'CalibrationContext':
+        """
+        :param df_data (DataFrame): weekly incidence data
+        :param df_calib (DataFrame): first weeks of the data used for calibration
+        :param groups (list[str]): data columns being fitted
+        :param weights (dict): weights of the data points per group (see getWeights4Data)
+        """
+        data = _frozen_array(df_data[groups].to_numpy(dtype=float).T)
+        calib_data = _frozen_array(df_calib[groups].to_numpy(dtype=float).T)
+        weights_array = _frozen_array([weights[group] for group in groups])
+        calib_weights = _frozen_array(weights_array[:, :calib_data.shape[1]])
+        peak_indices, peak_values = dtf.max_elem_indices_array(data)
+
+        return cls(groups=tuple(groups),
+                   data=data,
+                   calib_data=calib_data,
+                   weights=weights_array,
+                   calib_weights=calib_weights,
+                   res2=_frozen_array(dtf.find_residuals_weighted_array(data, weights_array)),
+                   calib_res2=_frozen_array(dtf.find_residuals_weighted_array(calib_data, calib_weights)),
+                   peak_indices=_frozen_array(peak_indices).astype(int),
+                   peak_values=_frozen_array(peak_values))
@@ -0,0 +1,161 @@
+from dataclasses import dataclass, field
+from typing import Optional, Tuple, Dict, Any
+
+import numpy as np
+
+from .calibration_context import CalibrationContext
+from .objective_cache import ObjectiveCache
+from .event_sink import EventSink
+from .profiler import StageProfiler
+
+
+@dataclass(frozen=True)
+class CalibrationTask:
+    """
+    Compact description of a calibration sent to worker processes instead of a whole optimizer:
+    the model configuration, the data-dependent part of the fit function and the search settings
+    """
+    model_cls: type
+    model_args: tuple  # BRModel constructor arguments
+    model_settings: Dict[str, Any]  # model attributes changed after construction
+    optimizer_cls: type
+    groups: Tuple[str, ...]
+    sigma: float
+    calib_context: CalibrationContext
+    param_ranges: Tuple[Tuple[float, float], ...]
+    tpeak_bias_aux: int = 0
+    tpeak_candidates: Optional[Tuple[int, ...]] = None
+    seed: Optional[int] = None
+    anneal_population: int = 0
+    warm_start: str = 'anneal'
+    screening_samples: int = 2048
+    screening_top_k: int = 3
+    screening_batch_size: int = 64
+    local_method: str = 'Nelder-Mead'
+    fd_step: float = 1e-7
+    local_maxiter: Optional[int] = None
+    bootstrap_mode: bool = False
+    checkpoint_dir: Optional[str] = None
+    checkpoint_interval: float = 60.0
+    stage: Optional[str] = None  # stage the fit function of the task is evaluated in
+    cache_settings: Dict[str, Any] = field(default_factory=dict)  # ObjectiveCache constructor arguments
+    event_settings: Dict[str, Any] = field(default_factory=dict)  # EventSink constructor arguments
+    profile_settings: Dict[str, Any] = field(default_factory=dict)  # StageProfiler constructor arguments
+
+    def build_optimizer(self):
+        """Rebuilds the model and a single-process optimizer in the current process"""
+        model = self.model_cls(*self.model_args)
+        for name, value in self.model_settings.items():
+            setattr(model, name, value)
+
+        optimizer = self.optimizer_cls(model, None, True, self.sigma)
+        optimizer.groups = list(self.groups)
+        optimizer.calib_context = self.calib_context
+        optimizer.param_ranges = [tuple(param_range) for param_range in self.param_ranges]
+        optimizer.tpeak_bias_aux = self.tpeak_bias_aux
+        optimizer.tpeak_candidates = self.tpeak_candidates
+        optimizer.seed = self.seed
+        optimizer.anneal_population = self.anneal_population
+        optimizer.warm_start = self.warm_start
+        optimizer.screening_samples = self.screening_samples
+        optimizer.screening_top_k = self.screening_top_k
+        optimizer.screening_batch_size = self.screening_batch_size
+        optimizer.local_method = self.local_method
+        optimizer.fd_step = self.fd_step
+        optimizer.local_maxiter = self.local_maxiter
+        optimizer.bootstrap_mode = self.bootstrap_mode
+        optimizer.checkpoint_dir = self.checkpoint_dir
+        optimizer.checkpoint_interval = self.checkpoint_interval
+        optimizer.stage = self.stage
+        optimizer.processes = 1  # pool workers cannot start their own pools
+        optimizer.objective_cache = ObjectiveCache(**self.cache_settings)
+        optimizer.reset_objective_cache()
+        event_settings = dict(self.event_settings)
+        if self.seed is not None:
+            event_settings['tags'] = dict(event_settings.get('tags', {}), seed=self.seed)
+        optimizer.events = EventSink(**event_settings)
+        optimizer.profiler = StageProfiler(**self.profile_settings)
+        return optimizer
+
+
+@dataclass(frozen=True)
+class ChainResult:
+    """Optimum of a calibration chain with its summary metrics"""
+    seed: Optional[int]
+    tpeak_bias_aux: int
+    x: Tuple[float, ...]
+    fun: float
+    nfev: int
+    delta: int
+    R2: Tuple[float, ...] = field(default_factory=tuple)
+    cache_stats: Dict[str, int] = field(default_factory=dict)
+    evaluations: int = 0
+    profile: Dict[str, Dict[str, float]] = field(default_factory=dict)  # StageProfiler.stats of the chain
+
+
+def run_chain_task(task: CalibrationTask) -> ChainResult:
+    """Runs one annealing + local search chain described by the task"""
+    optimizer = task.build_optimizer()
+    seed, opt_result = optimizer.run_chain(task.seed)
+    optimizer.stage = 'final'
+    optimizer.compute_fit_function(opt_result.x)  # summary metrics at the optimum
+    optimizer.events.flush()
+
+    return ChainResult(seed=seed,
+                       tpeak_bias_aux=optimizer.tpeak_bias_aux,
+                       x=tuple(float(value) for value in opt_result.x),
+                       fun=float(opt_result.fun),
+                       nfev=int(opt_result.nfev),
+                       delta=int(optimizer.delta),
+                       R2=tuple(optimizer.R_square_list),
+                       cache_stats=optimizer.objective_cache.stats(),
+                       evaluations=optimizer.evaluations,
+                       profile=optimizer.profiler.stats())
+
+
+class TaskObjective:
+    """
+    Picklable fit function of a calibration task: only the task is pickled,
+    the optimizer is rebuilt once in the process the function is called from
+    """
+    def __init__(self, task: CalibrationTask, optimizer=None):
+        self.task = task
+        self._optimizer = optimizer
+
+    def __getstate__(self):
+        return {'task': self.task}
+
+    def __setstate__(self, state):
+        self.task = state['task']
+        self._optimizer = None
+
+    @property
+    def optimizer(self):
+        if self._optimizer is None:
+            self._optimizer = self.task.build_optimizer()
+        return self._optimizer
+
+    def __call__(self, k):
+        return self.optimizer.fit_function(k)
+
+    def batch(self, K):
+        values = self.optimizer.fit_function_batch(K)
+        # pool workers are stopped without notice, their events are written after every batch
+        self.optimizer.events.flush()
+        return values
+
+
+_worker_energy_funcs = (None, None)
+
+
+def init_energy_worker(energy_func, batch_energy_func):
+    """Keeps the energy functions in a pool worker, so they are sent to every worker only once"""
+    global _worker_energy_funcs
+    _worker_energy_funcs = (energy_func, batch_energy_func)
+
+
+def worker_energy(states):
+    energy_func, batch_energy_func = _worker_energy_funcs
+    if batch_energy_func is not None:
+        return np.asarray(batch_energy_func(states))
+    return np.array([energy_func(state) for state in states])
@@ -0,0 +1,84 @@
+import os
+import time
+import pickle
+import random
+import os.path as osp
+
+import numpy as np
+
+
+class CalibrationCheckpoint:
+    """
+    Periodically saved state of a calibration chain. The state is a dictionary with the calibration
+    stage ('anneal', 'local' or 'done') stored together with the random generators state and the key
+    of the calibration setup it was saved for
+    """
+    def __init__(self, path, interval=60.0, key=''):
+        """
+        :param path (str): checkpoint file path
+        :param interval (float): minimal time in seconds between two checkpoints
+        :param key (str): digest of the data and the settings of the calibration, see BaseOptimizer.checkpoint_key
+        """
+        self.path = path
+        self.interval = interval
+        self.key = key
+        self._last_save = time.time()
+
+    def due(self):
+        """Checks whether the checkpoint interval has passed since the last save"""
+        return time.time() - self._last_save >= self.interval
+
+    def save(self, stage, **state):
+        state.update(stage=stage,
+                     key=self.key,
+                     np_random_state=np.random.get_state(),
+                     random_state=random.getstate())
+
+        os.makedirs(osp.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(state, f)
+        os.replace(tmp_path, self.path)  # a crash during saving keeps the previous checkpoint
+        self._last_save = time.time()
+
+    def load(self):
+        """Returns the saved state or None if there is no checkpoint"""
+        if not osp.exists(self.path):
+            return None
+        with open(self.path, 'rb') as f:
+            return pickle.load(f)
+
+    def matches(self, state):
+        """Checks whether the state was saved for the same calibration setup"""
+        return state.get('key') == self.key
+
+    @staticmethod
+    def restore_random_state(state):
+        np.random.set_state(state['np_random_state'])
+        random.setstate(state['random_state'])
+
+
+class EvaluationLog:
+    """
+    Fit function evaluations of the local search in their order. The search resumed from a checkpoint is
+    started again from its initial point with the recorded evaluations replayed instead of simulated,
+    so that it takes the same steps as the interrupted search
+    """
+    def __init__(self, recorded=None):
+        """
+        :param recorded (list): (point, result) evaluations of the interrupted search
+        """
+        self.evaluations = []  # (point, result)
+        self._recorded = list(recorded or [])
+
+    def replay(self, point):
+        """Returns the recorded result of the next evaluation or None if there is none for the point"""
+        if len(self.evaluations) < len(self._recorded):
+            recorded_point, result = self._recorded[len(self.evaluations)]
+            if np.array_equal(recorded_point, point):
+                return result
+        self._recorded = []  # the search does not follow the recorded one, the rest is simulated
+        return None
+
+    def add(self, point, result):
+        self.evaluations.append((np.array(point, dtype=float), result))
@@ -0,0 +1,91 @@
+import os
+import json
+import time
+import os.path as osp
+from typing import Optional, Dict, Any
+
+# console verbosity levels of the events
+QUIET, SUMMARY, PROGRESS, EVALUATIONS = 0, 1, 2, 3
+
+
+class EventSink:
+    """
+    Buffered sink of the calibration events: stage summaries, annealing progress and the fit function
+    evaluations are written as JSON lines to a file and/or put to a queue; the events up to the verbosity
+    level are also printed. Every evaluations-th evaluation and every improvement of the fit function
+    are recorded, so that long calibrations can be monitored without printing every evaluation
+    """
+    def __init__(self, path: Optional[str] = None, verbosity: int = SUMMARY, every: int = 1,
+                 buffer_size: int = 256, queue=None, tags: Optional[Dict[str, Any]] = None):
+        """
+        :param path (str): JSON lines file the events are appended to, None to keep them in memory only
+        :param verbosity (int): events up to this level are printed (0 - nothing, 1 - stage summaries,
+                                2 - annealing progress, 3 - recorded evaluations)
+        :param every (int): every n-th fit function evaluation is recorded
+        :param buffer_size (int): number of events buffered before they are written to the file
+        :param queue: queue the events are put to (e.g. multiprocessing.Manager().Queue()), None to disable
+        :param tags (dict): fields added to every event, e.g. the chain seed
+        """
+        self.path = path
+        self.verbosity = verbosity
+        self.every = max(int(every), 1)
+        self.buffer_size = buffer_size
+        self.queue = queue
+        self.tags = dict(tags or {})
+
+        self.evaluations = 0
+        self.best_energy = float('inf')
+        self._buffer = []
+        # evaluations are skipped at once if nobody consumes them
+        self.records_evaluations = path is not None or queue is not None or verbosity >= EVALUATIONS
+
+    def settings(self):
+        """Constructor arguments, the sink is rebuilt from them in worker processes"""
+        return {'path': self.path, 'verbosity': self.verbosity, 'every': self.every,
+                'buffer_size': self.buffer_size, 'queue': self.queue, 'tags': dict(self.tags)}
+
+    def __getstate__(self):
+        return self.settings()
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def emit(self, event: str, message: Optional[str] = None, level: int = SUMMARY, **fields):
+        """
+        Records an event
+        :param message (str): text printed if the verbosity is not below the level
+        """
+        if message is not None and self.verbosity >= level:
+            print(message)
+        if self.path is None and self.queue is None:
+            return
+        record = {'time': time.time(), 'event': event, **self.tags, **fields}
+        if self.queue is not None:
+            self.queue.put(record)
+        if self.path is not None:
+            self._buffer.append(record)
+            if level <= SUMMARY or len(self._buffer) >= self.buffer_size:
+                self.flush()
+
+    def evaluation(self, stage: str, energy: float, r_squared, elapsed: float, **fields):
+        """Records a fit function evaluation if it is an every-th one or improves the best value"""
+        self.evaluations += 1
+        if not self.records_evaluations:
+            return
+        improved = energy < self.best_energy
+        if improved:
+            self.best_energy = energy
+        if self.evaluations % self.every and not improved:
+            return
+        self.emit('evaluation', f" R2: {r_squared}", level=EVALUATIONS, stage=stage, evaluation=self.evaluations,
+                  energy=energy, R2=r_squared, elapsed=elapsed, improved=improved, **fields)
+
+    def flush(self):
+        if not self._buffer:
+            return
+        os.makedirs(osp.dirname(self.path) or '.', exist_ok=True)
+        lines = ''.join(json.dumps(record, default=float) + '\n' for record in self._buffer)
+        # a single appending write, so that the lines of concurrent chains are not interleaved
+        with open(self.path, 'a') as f:
+            f.write(lines)
+        self._buffer = []
@@ -0,0 +1,126 @@
+import os
+import sqlite3
+import hashlib
+import os.path as osp
+from collections import OrderedDict
+
+import numpy as np
+
+
+def digest_key_parts(*key_parts):
+    """
+    :param key_parts: data arrays and configuration values
+    returns (str): SHA-256 hex digest of the parts
+    """
+    digest = hashlib.sha256()
+    for part in key_parts:
+        digest.update(part.tobytes() if isinstance(part, np.ndarray) else repr(part).encode('utf8'))
+    return digest.hexdigest()
+
+
+class ObjectiveCache:
+    """
+    LRU cache of the fit function values keyed on the rounded parameter vector and the peak offsets,
+    with an optional on-disk SQLite tier shared between runs with the same data and model configuration
+    """
+    def __init__(self, maxsize=4096, decimals=10, disk_path=None):
+        """
+        :param maxsize (int): number of values kept in memory, 0 to disable the cache
+        :param decimals (int): number of decimals the parameters are rounded to
+        :param disk_path (str): SQLite file of the on-disk tier, None to keep values in memory only
+        """
+        self.maxsize = maxsize
+        self.decimals = decimals
+        self.disk_path = disk_path
+        self.disk_key = ''
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._connection = None
+
+    def settings(self):
+        """Constructor arguments to build the same cache in another process"""
+        return {'maxsize': self.maxsize, 'decimals': self.decimals, 'disk_path': self.disk_path}
+
+    def reset(self, *key_parts):
+        """
+        Clears the in-memory values and sets the key of the on-disk tier
+        :param key_parts: data arrays and configuration values the fit function depends on
+        """
+        self._entries.clear()
+        self.hits = self.disk_hits = self.misses = 0
+        self.disk_key = digest_key_parts(*key_parts)
+
+    def _key(self, k, peak_offsets):
+        return tuple(np.round(np.asarray(k, dtype=float), self.decimals).tolist()) + (tuple(peak_offsets),)
+
+    def get(self, k, peak_offsets):
+        """Returns the cached value or None"""
+        if self.maxsize <= 0:
+            return None
+        key = self._key(k, peak_offsets)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+        value = self._disk_get(key)
+        if value is not None:
+            self.disk_hits += 1
+            self._store(key, value)
+            return value
+
+        self.misses += 1
+        return None
+
+    def put(self, k, peak_offsets, value):
+        if self.maxsize <= 0:
+            return
+        key = self._key(k, peak_offsets)
+        self._store(key, value)
+        self._disk_put(key, value)
+
+    def _store(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _get_connection(self):
+        if self._connection is None:
+            # autocommit, so that the chains running in other processes are not blocked by an open transaction
+            os.makedirs(osp.dirname(self.disk_path) or '.', exist_ok=True)
+            self._connection = sqlite3.connect(self.disk_path, timeout=60, isolation_level=None)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS fit_values (key TEXT PRIMARY KEY, value REAL)')
+        return self._connection
+
+    def _disk_record_key(self, key):
+        return self.disk_key + ':' + repr(key)
+
+    def _disk_get(self, key):
+        if self.disk_path is None:
+            return None
+        row = self._get_connection().execute('SELECT value FROM fit_values WHERE key = ?',
+                                             (self._disk_record_key(key),)).fetchone()
+        return None if row is None else row[0]
+
+    def _disk_put(self, key, value):
+        if self.disk_path is None:
+            return
+        self._get_connection().execute('INSERT OR REPLACE INTO fit_values VALUES (?, ?)',
+                                       (self._disk_record_key(key), float(value)))
+
+    def stats(self):
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses}
+
+    def __getstate__(self):
+        # connections and values stay in the process they were created in
+        return self.settings()
+
+    def __setstate__(self, state):
+        self.__init__(**state)
@@ -8,7 +8,7 @@ class AgeModelOptimizer(BaseOptimizer):
         self.age_group_ind = 1
         self.age_groups = model.age_groups if self.model.incidence_type == 'age-group' else ['total']
 
-    def fit_function(self, k):
+    def unpack_parameters(self, k):
         age_groups_num = len(self.age_groups)
         exposed_list = []  # k[:age_groups_num]
 
@@ -22,10 +22,7 @@ class AgeModelOptimizer(BaseOptimizer):
         else:
             a = [k[age_groups_num + 1]]  # Default position for a value
 
-        dist2_list = self.find_model_fit(exposed_list, lam_list, a)
-        dist2 = sum(dist2_list)
-
-        return dist2
+        return exposed_list, lam_list, a
 
     def calculate_population_immunity(self, exposed_list, a):
         pass
@@ -13,7 +13,7 @@ class StrainModelOptimizer(BaseOptimizer):
         # groups are following: ['A(H1N1)pdm09_0-14', 'A(H3N2)_0-14', 'B_0-14',
         # 'A(H1N1)pdm09_15 и ст.', 'A(H3N2)_15 и ст.', 'B_15 и ст.'] [order of groups matters]
 
-    def fit_function(self, k):
+    def unpack_parameters(self, k):
         age_groups_num = len(self.age_groups)
         strains_num = len(self.strains)
         n = strains_num * age_groups_num
@@ -34,10 +34,7 @@ class StrainModelOptimizer(BaseOptimizer):
         lam_list = list(k[n:n + strains_num])
         a = list(k[-age_groups_num:])
 
-        dist2_list = self.find_model_fit(exposed_list, lam_list, a)
-        dist2 = sum(dist2_list)
-
-        return dist2
+        return exposed_list, lam_list, a
 
     def calculate_population_immunity(self, exposed_list, a):
         for i in range(0, len(exposed_list)):
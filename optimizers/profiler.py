@@ -0,0 +1,79 @@
+import time
+from contextlib import nullcontext
+from typing import Dict, List
+
+# stages of a fit function evaluation, in the order they run
+HOT_PATH_STAGES = ('model_setup', 'simulation', 'weekly_aggregation', 'alignment', 'scoring')
+
+_DISABLED = nullcontext()
+
+
+class _StageTimer:
+    __slots__ = ('totals', 'start')
+
+    def __init__(self, totals: List[float]):
+        self.totals = totals  # [calls, seconds]
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.totals[0] += 1
+        self.totals[1] += time.perf_counter() - self.start
+
+
+class StageProfiler:
+    """
+    Accumulates the wall time and the number of calls of the named calibration stages.
+    A disabled profiler hands out a shared no-op context, so the timed code pays a single call per stage
+    """
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.totals: Dict[str, List[float]] = {}
+        self._timers: Dict[str, _StageTimer] = {}
+
+    def settings(self):
+        return {'enabled': self.enabled}
+
+    def __getstate__(self):
+        return self.settings()
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def stage(self, name: str):
+        """Context manager timing one run of the stage"""
+        if not self.enabled:
+            return _DISABLED
+        timer = self._timers.get(name)
+        if timer is None:
+            timer = self._timers[name] = _StageTimer(self.totals.setdefault(name, [0, 0.0]))
+        return timer
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """returns (dict): calls and seconds of every stage"""
+        return {name: {'calls': int(calls), 'seconds': seconds} for name, (calls, seconds) in self.totals.items()}
+
+    def add(self, stats: Dict[str, Dict[str, float]]):
+        """Adds the stage statistics of another process, e.g. of a calibration chain"""
+        for name, stage in stats.items():
+            totals = self.totals.setdefault(name, [0, 0.0])
+            totals[0] += stage['calls']
+            totals[1] += stage['seconds']
+
+    def report(self, evaluations: int = 0, wall_time: float = None) -> Dict:
+        """
+        Profile of the run: per stage calls, total and mean seconds, and the share of the fit function
+        evaluation time for the hot path stages
+        """
+        stats = self.stats()
+        hot_path_time = sum(stats[name]['seconds'] for name in HOT_PATH_STAGES if name in stats)
+        stages = {}
+        for name, stage in stats.items():
+            stages[name] = dict(stage, mean=stage['seconds'] / stage['calls'] if stage['calls'] else 0.0)
+            if name in HOT_PATH_STAGES and hot_path_time > 0:
+                stages[name]['share'] = stage['seconds'] / hot_path_time
+        return {'wall_time': wall_time, 'evaluations': evaluations,
+                'seconds_per_evaluation': hot_path_time / evaluations if evaluations else None,
+                'stages': stages}
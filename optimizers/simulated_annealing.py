@@ -1,116 +1,172 @@
-import sys, time
+import time, math, random
 import numpy as np
+from multiprocessing import Pool
 from simanneal import Annealer
 
 from .aux_functions import data_functions as datf
+from .calibration_task import init_energy_worker, worker_energy
+from .event_sink import EventSink, PROGRESS
 
 
 class InitValueFinder(Annealer):
     """Test annealer
     """
     ranges = []
-    history_states = []
-    age_groups = []
-    incidence_type = ""
-    a_detail = False
     energy_func = None
+    batch_energy_func = None
 
     # pass extra data (the distance matrix) into the constructor
-    def __init__(self, state, ranges, history_states, age_groups, incidence_type, a_detail,
-                 optimum_func):
+    def __init__(self, state, ranges, energy_func, batch_energy_func=None, population=0, processes=1,
+                 checkpoint=None, events=None):
+        """
+        :param state: initial parameter vector
+        :param ranges (list[tuple]): parameter ranges
+        :param energy_func: fit function of a single parameter vector
+        :param batch_energy_func: fit function of a (population, parameters) matrix
+        :param population (int): number of candidate states evaluated per temperature step,
+                                 0 for the sequential simanneal schedule
+        :param processes (int): number of worker processes the population is split across
+        :param checkpoint (CalibrationCheckpoint): checkpoint the annealing state is periodically saved to
+        :param events (EventSink): sink of the annealing progress events
+        """
         self.ranges = ranges
-        self.history_states = history_states
-        self.age_groups = age_groups
-        self.incidence_type = incidence_type
-        self.energy_func = optimum_func
-        self.a_detail = a_detail
+        self.energy_func = energy_func
+        self.batch_energy_func = batch_energy_func
+        self.population = population
+        self.processes = processes
+        self.evaluations = 0
+        self.checkpoint = checkpoint
+        self.events = events or EventSink()
+        self.resumed_best = None  # best state and energy found before the annealing was resumed
         self.steps = 1000  #10000
-        self.updates = 100  # 100 # number of line being printed in stdout
+        self.updates = 100  # 100 # number of progress events
         self.copy_strategy = "slice"
         self.state = state
         super(InitValueFinder, self).__init__(state)  # important!
 
     def move(self):
         """Moves to different argument"""
+        self.state = self.sample_states(1)[0]
 
-        state_list = []
-        for i in range(0, len(self.state)):
-            state_list.append(np.random.uniform(self.ranges[i][0], self.ranges[i][1]))
-        state_array = np.array(state_list)
-
-        self.state = state_array
+    def sample_states(self, states_num):
+        """Draws states uniformly from the parameter ranges"""
+        lower, upper = np.asarray(self.ranges, dtype=float).T
+        return np.random.uniform(lower, upper, size=(states_num, len(self.ranges)))
 
     def energy(self):
         """Calculates the optimization function value"""
-
-        exposed_list,  lam_list,  a_list = [], [], []
-        age_groups_num = len(self.age_groups)
-        strains_num = len(self.history_states) - 1
-
-        if self.incidence_type in ['age-group', 'total']:
-
-            for item in self.state[:age_groups_num]:
-                exposed_list.append([item, 1-item])
-
-            lam_idx = age_groups_num
-            lam_list = [self.state[age_groups_num]]
-
-            if self.a_detail:
-                # todo: change later
-                a_list = [0] * len(self.age_groups)
-                a_idx = lam_idx + 1
-                for idx_j, age_group in enumerate(self.age_groups):  # 4 groups
-                    a_list[idx_j] = self.state[a_idx + idx_j]
-            else:
-                a_idx = lam_idx + 1
-                a_list = [self.state[a_idx]]
-
-        elif self.incidence_type == 'strain_age-group':
-
-            for i in range(age_groups_num):
-                sum_exposed = sum(self.state[i * strains_num:i * strains_num + strains_num])
-
-                if sum_exposed < 1:
-                    temp = [self.state[i * strains_num + m] for m in range(strains_num)]
-                    temp.append(1 - sum_exposed)
-                else:
-                    temp = [self.state[i * strains_num + m] / sum_exposed for m in range(strains_num)]
-                    temp.append(0)
-                exposed_list.append(temp)
-
-            n = age_groups_num * strains_num
-            lam_list = list(self.state[n:n+strains_num])
-            a_list = list(self.state[-age_groups_num:])
-
-        if self.incidence_type == 'strain':
-            self.state = list(self.state)
-            sum_exposed = sum(self.state[:strains_num])
-            if sum_exposed < 1:
-                exposed_list = self.state[:strains_num]
-                exposed_list.append(1-sum_exposed)
-            else:
-                exposed_list = [item / sum_exposed for item in self.state[:strains_num]]
-                exposed_list.append(0)
-
-            lam_list = self.state[strains_num:2*strains_num]
-            a_list = [self.state[-1]]
-
-        dist2_list = self.energy_func(exposed_list, lam_list, a_list)
-        dist2 = sum(dist2_list)
-
-        return dist2
+        self.evaluations += 1
+        return self.energy_func(self.state)
+
+    def batch_energy(self, states, pool=None):
+        """Calculates the optimization function values of several states"""
+        self.evaluations += len(states)
+        if pool is not None:
+            chunks = [chunk for chunk in np.array_split(states, self.processes) if len(chunk)]
+            return np.concatenate(pool.map(worker_energy, chunks))
+        if self.batch_energy_func is not None:
+            return np.asarray(self.batch_energy_func(states))
+        return np.array([self.energy_func(state) for state in states])
+
+    def anneal(self):
+        """Runs the sequential simanneal schedule or the population one if the population size is set"""
+        if self.steps <= 0:
+            return self.resumed_best
+        if self.population > 0:
+            best_state, best_energy = self.anneal_population()
+        else:
+            best_state, best_energy = super(InitValueFinder, self).anneal()
+
+        if self.resumed_best is not None and self.resumed_best[1] < best_energy:
+            best_state, best_energy = self.resumed_best
+            self.state = self.copy_state(best_state)
+        return best_state, best_energy
+
+    def get_checkpoint_state(self, step, T, E):
+        """Annealing state at the given step, the remaining schedule starts from the temperature T"""
+        best_state, best_energy = self.copy_state(self.best_state), self.best_energy
+        if self.resumed_best is not None and self.resumed_best[1] < best_energy:
+            best_state, best_energy = self.resumed_best
+        return {'state': self.copy_state(self.state), 'energy': E, 'T': T, 'steps_left': self.steps - step,
+                'best_state': best_state, 'best_energy': best_energy, 'evaluations': self.evaluations}
+
+    def resume(self, anneal_state):
+        """Continues the temperature schedule from the saved annealing state"""
+        self.state = self.copy_state(anneal_state['state'])
+        self.Tmax = anneal_state['T']
+        self.steps = anneal_state['steps_left']
+        self.evaluations = anneal_state['evaluations']
+        self.resumed_best = (anneal_state['best_state'], anneal_state['best_energy'])
+
+    def anneal_population(self):
+        """
+        Population-based annealing: at every temperature step a population of candidate states is
+        evaluated at once (with a batched fit function and/or across a process pool), the best candidate
+        is accepted by the Metropolis criterion and the best-so-far state is kept
+        returns: best state, best energy
+        """
+        pool = None
+        if self.processes > 1:
+            pool = Pool(processes=self.processes, initializer=init_energy_worker,
+                        initargs=(self.energy_func, self.batch_energy_func))
+        try:
+            return self._anneal_population(pool)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+    def _anneal_population(self, pool):
+        step = 0
+        self.start = time.time()
+        Tfactor = -math.log(self.Tmax / self.Tmin)
+
+        T = self.Tmax
+        E = self.batch_energy(np.asarray([self.state], dtype=float), pool)[0]
+        self.best_state, self.best_energy = self.copy_state(self.state), E
+        trials, accepts, improves = 0, 0, 0
+        update_wavelength = self.steps / self.updates
+        self.update(step, T, E, None, None)
+
+        while step < self.steps and not self.user_exit:
+            step += 1
+            T = self.Tmax * math.exp(Tfactor * step / self.steps)
+            candidates = self.sample_states(self.population)
+            energies = self.batch_energy(candidates, pool)
+            best = int(np.argmin(energies))
+
+            dE = energies[best] - E
+            trials += 1
+            if dE <= 0.0 or math.exp(-dE / T) >= random.random():
+                accepts += 1
+                if dE < 0.0:
+                    improves += 1
+                self.state, E = candidates[best], energies[best]
+                if E < self.best_energy:
+                    self.best_state, self.best_energy = self.copy_state(self.state), E
+
+            if (step // update_wavelength) > ((step - 1) // update_wavelength):
+                self.update(step, T, E, accepts / trials, improves / trials)
+                trials, accepts, improves = 0, 0, 0
+
+        self.state = self.copy_state(self.best_state)
+        return self.best_state, self.best_energy
 
     def update(self, step, T, E, acceptance, improvement):
+        if step > 0 and self.checkpoint is not None and self.checkpoint.due():
+            self.checkpoint.save('anneal', anneal=self.get_checkpoint_state(step, T, E))
+
         elapsed = time.time() - self.start
+        throughput = self.evaluations / elapsed if elapsed > 0 else 0.0
         if step == 0:
-            print(' Temperature        Energy    Accept   Improve     Elapsed   Remaining',
-                  file=sys.stderr)
-            print('\r%12.5f  %12.2f                      %s            ' %
-                  (T, E, datf.time_string(elapsed)), file=sys.stderr)
-            sys.stderr.flush()
+            message = (' Temperature        Energy    Accept   Improve     Elapsed   Remaining   Evals/s\n'
+                       '%12.5f  %12.2f                      %s' % (T, E, datf.time_string(elapsed)))
+            remain = None
         else:
             remain = (self.steps - step) * (elapsed / step)
-            print('\r%12.5f  %12.2f  %7.2f%%  %7.2f%%  %s  %s\r' %
-                  (T, E, 100.0 * acceptance, 100.0 * improvement,
-                   datf.time_string(elapsed), datf.time_string(remain)), file=sys.stderr)
-            sys.stderr.flush()
+            message = '%12.5f  %12.2f  %7.2f%%  %7.2f%%  %s  %s  %8.1f' % \
+                      (T, E, 100.0 * acceptance, 100.0 * improvement,
+                       datf.time_string(elapsed), datf.time_string(remain), throughput)
+        self.events.emit('anneal', message, level=PROGRESS, step=step, steps=self.steps, T=T, energy=E,
+                         acceptance=acceptance, improvement=improvement, elapsed=elapsed, remaining=remain,
+                         evals_per_s=throughput)
@@ -17,6 +17,7 @@ class ExperimentalSetup:
     pop_size: float
     mu: float
     sigma: float
+    engine: str = None  # simulation engine of the model, BRModel.default_engine by default
 
     def get_model_and_optimizer(self):
         model, optimizer = BRModel, None
@@ -29,7 +30,7 @@ class ExperimentalSetup:
 
     def setup_model(self, model):
         return model(self.contact_matrix, self.pop_size, self.mu,
-                     self.incidence_type, self.age_groups, self.strains)
+                     self.incidence_type, self.age_groups, self.strains, self.engine)
 
     def setup_optimizer(self, optimizer, model, data, model_detailed):
         return optimizer(model, data, model_detailed, self.sigma)
@@ -0,0 +1,214 @@
+import io
+import os
+import re
+import sys
+import json
+import sqlite3
+import os.path as osp
+from datetime import datetime
+from dataclasses import dataclass
+from typing import Dict, Any, Optional
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+RESULT_STORE_FILE = 'output/results.sqlite'
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created TEXT NOT NULL,
+    incidence TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    city TEXT NOT NULL,
+    mu REAL,
+    sigma REAL,
+    r2_mean REAL,
+    source TEXT,
+    parameters TEXT NOT NULL,
+    config TEXT,
+    model_fit BLOB NOT NULL,
+    calibration_data BLOB NOT NULL,
+    original_data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_key ON runs (incidence, year, city, mu, sigma);
+"""
+_INDEX_COLUMNS = ['id', 'created', 'incidence', 'year', 'city', 'mu', 'sigma', 'r2_mean', 'source']
+
+
+def frame_to_bytes(df: DataFrame) -> bytes:
+    """Serializes a numeric data frame as an uncompressed .npz archive"""
+    index = np.asarray(df.index)
+    buffer = io.BytesIO()
+    np.savez(buffer, values=df.to_numpy(dtype=float),
+             index=index.astype(str) if index.dtype == object else index,
+             columns=np.asarray([str(column) for column in df.columns]))
+    return buffer.getvalue()
+
+
+def frame_from_bytes(data: bytes) -> DataFrame:
+    with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+        return pd.DataFrame(arrays['values'], index=arrays['index'], columns=arrays['columns'].tolist())
+
+
+@dataclass
+class StoredRun:
+    """Calibration run loaded from the result store"""
+    id: int
+    created: str
+    incidence: str
+    year: int
+    city: str
+    mu: Optional[float]
+    sigma: Optional[float]
+    parameters: Dict[str, Any]
+    config: Optional[Dict[str, Any]]
+    model_fit: DataFrame
+    calibration_data: DataFrame
+    original_data: DataFrame
+    source: Optional[str] = None
+
+
+class ResultStore:
+    """
+    SQLite file keeping the calibration runs: parameters, metrics, the run config and the fitted, calibration
+    and original weekly curves. The runs are indexed on (incidence, year, city, mu, sigma)
+    """
+    def __init__(self, path: str = RESULT_STORE_FILE):
+        self.path = path
+        os.makedirs(osp.dirname(path) or '.', exist_ok=True)
+        # several calibration processes may write to the store at once
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version > SCHEMA_VERSION:
+            raise RuntimeError(f"Result store {path} has schema version {version}, "
+                               f"the supported version is {SCHEMA_VERSION}")
+        with self.connection:
+            self.connection.executescript(_SCHEMA)
+            self.connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def close(self):
+        self.connection.close()
+
+    def save(self, parameters: Dict, simulated_data: DataFrame, calibration_data: DataFrame,
+             original_data: DataFrame, incidence: str, year: int, city: str, mu: float = None,
+             sigma: float = None, config: Dict = None, source: str = None, created: str = None) -> int:
+        """
+        Appends a calibration run
+        :param parameters (dict): calibrated parameters and metrics (see fit_one_outbreak)
+        :param source (str): results directory of the run, if any
+        returns (int): run id
+        """
+        r2 = [value for value in parameters.get('R2', []) if value is not None]
+        with self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO runs (created, incidence, year, city, mu, sigma, r2_mean, source, parameters, config, '
+                'model_fit, calibration_data, original_data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (created or datetime.now().isoformat(timespec='seconds'), incidence, int(year), city,
+                 mu, sigma, float(np.mean(r2)) if r2 else None, source,
+                 json.dumps(parameters), json.dumps(config) if config is not None else None,
+                 frame_to_bytes(simulated_data), frame_to_bytes(calibration_data), frame_to_bytes(original_data)))
+        return cursor.lastrowid
+
+    def find(self, incidence: str = None, year: int = None, city: str = None,
+             mu: float = None, sigma: float = None) -> DataFrame:
+        """
+        Looks the runs up by the indexed keys, None matches any value
+        returns (DataFrame): runs without the curves, the latest first
+        """
+        conditions, values = [], []
+        for name, value in [('incidence', incidence), ('year', year), ('city', city), ('mu', mu), ('sigma', sigma)]:
+            if value is not None:
+                conditions.append(f'{name} = ?')
+                values.append(value)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+        query = f"SELECT {', '.join(_INDEX_COLUMNS)} FROM runs{where} ORDER BY created DESC, id DESC"
+        rows = self.connection.execute(query, values).fetchall()
+        return pd.DataFrame(rows, columns=_INDEX_COLUMNS)
+
+    def load(self, run_id: int) -> StoredRun:
+        row = self.connection.execute(
+            'SELECT id, created, incidence, year, city, mu, sigma, parameters, config, '
+            'model_fit, calibration_data, original_data, source FROM runs WHERE id = ?', (run_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"There is no run {run_id} in {self.path}")
+
+        return StoredRun(id=row[0], created=row[1], incidence=row[2], year=row[3], city=row[4], mu=row[5],
+                         sigma=row[6], parameters=json.loads(row[7]),
+                         config=json.loads(row[8]) if row[8] is not None else None,
+                         model_fit=frame_from_bytes(row[9]),
+                         calibration_data=frame_from_bytes(row[10]),
+                         original_data=frame_from_bytes(row[11]),
+                         source=row[12])
+
+    def latest(self, incidence: str = None, year: int = None, city: str = None,
+               mu: float = None, sigma: float = None) -> StoredRun:
+        runs = self.find(incidence, year, city, mu, sigma)
+        if runs.empty:
+            raise KeyError("There are no matching runs in the result store")
+        return self.load(int(runs['id'].iloc[0]))
+
+    def get_parameters(self, run_id: int):
+        """Replaces utils.get_parameters: returns exposed, lambda, a, delta, R2 of the run"""
+        params = self.load(run_id).parameters
+        return params['exposed'], params['lambda'], params['a'], params['delta'], params['R2']
+
+    def restore_from_saved_data(self, run_id: int):
+        """Replaces utils.restore_from_saved_data: returns calibration data, model fit, original data of the run"""
+        run = self.load(run_id)
+        return run.calibration_data, run.model_fit, run.original_data
+
+    def import_directory(self, full_path: str, city: str = '') -> Optional[int]:
+        """
+        Imports a results directory written by save_results, the keys are parsed from the directory name
+        ('<incidence>_<year>_<timestamp>[_mu_<mu>][_sigma_<sigma>]...') and the plot file name
+        returns (int): run id or None if the directory is already imported or not a results directory
+        """
+        from .utils import PARAMETERS_FILE, SIMULATED_DATA_FILE, CALIBRATION_DATA_FILE, INCIDENCE_DATA_FILE
+
+        full_path = osp.normpath(full_path)
+        name = osp.basename(full_path)
+        match = re.match(r'(strain_age-group|age-group|strain|total)_(\d{4})_(\d{4}_\d{2}_\d{2}_\d{2}_\d{2})', name)
+        if match is None or not osp.exists(osp.join(full_path, PARAMETERS_FILE)):
+            return None
+        if self.connection.execute('SELECT 1 FROM runs WHERE source = ?', (full_path,)).fetchone():
+            return None
+
+        incidence, year, timestamp = match.groups()
+        mu = re.search(r'_mu_([\d.]+?)(?:_|$)', name)
+        sigma = re.search(r'_sigma_([\d.]+?)(?:_|$)', name)
+        for file_name in os.listdir(full_path):
+            plot_match = re.match(rf'fit_{re.escape(incidence)}_(.+)_{year}\.png$', file_name)
+            if plot_match:
+                city = plot_match.group(1)
+
+        with open(osp.join(full_path, PARAMETERS_FILE), 'r') as f:
+            parameters = json.load(f)
+        read = lambda file_name: pd.read_csv(osp.join(full_path, file_name), index_col=0)
+        return self.save(parameters, read(SIMULATED_DATA_FILE), read(CALIBRATION_DATA_FILE), read(INCIDENCE_DATA_FILE),
+                         incidence, int(year), city,
+                         mu=float(mu.group(1)) if mu else None, sigma=float(sigma.group(1)) if sigma else None,
+                         source=full_path,
+                         created=datetime.strptime(timestamp, '%Y_%m_%d_%H_%M').isoformat(timespec='seconds'))
+
+
+def import_result_directories(root: str, store_path: str = RESULT_STORE_FILE):
+    """Imports all the results directories under root into the result store"""
+    store = ResultStore(store_path)
+    imported = 0
+    for dir_path, _, _ in os.walk(root):
+        try:
+            imported += store.import_directory(dir_path) is not None
+        except (OSError, ValueError, KeyError) as e:
+            print(f"{dir_path} is not imported: {e}")
+    store.close()
+    return imported
+
+
+if __name__ == '__main__':
+    # python -m utils.result_store [results root] [store file]
+    print(import_result_directories(*(sys.argv[1:] or ['output/data'])), 'runs imported')
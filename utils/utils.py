@@ -8,8 +8,6 @@ from pandas import DataFrame
 from datetime import datetime
 from typing import Dict, Any, List
 
-import matplotlib.colors as mcolors
-
 from .experiment_setup import ExperimentalSetup
 
 
@@ -18,8 +16,17 @@ SIMULATED_DATA_FILE = 'model_fit.csv'
 INCIDENCE_DATA_FILE = 'original_data.csv'
 CALIBRATION_DATA_FILE = 'calibration_data.csv'
 PARAMETERS_FILE = 'parameters.json'
+EVENTS_FILE = 'events.jsonl'
+PROFILE_FILE = 'profile.json'
+CPROFILE_FILE = 'profile.prof'
+
 
-COLORS = list(mcolors.TABLEAU_COLORS.keys()) + list(mcolors.BASE_COLORS.keys())
+def __getattr__(name):
+    # COLORS is built on first use, so that matplotlib is not imported with the module
+    if name == 'COLORS':
+        import matplotlib.colors as mcolors
+        return list(mcolors.TABLEAU_COLORS.keys()) + list(mcolors.BASE_COLORS.keys())
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def get_config(config_path):
@@ -97,20 +104,31 @@ def restore_from_saved_data(incidence: str):
 
 def restore_fit_from_params(contact_matrix: object, pop_size: float, incidence: str,
                             age_groups: List[str], strains: List[str], mu: float,
-                            sigma: float,  output_dir: str):
-
-    factory = ExperimentalSetup(incidence, age_groups, strains, contact_matrix, pop_size, mu, sigma)
+                            sigma: float,  output_dir: str = None, run=None, engine: str = None):
+    """
+    Simulates the model with the saved parameters
+    :param output_dir (str): results directory of the calibration
+    :param run (StoredRun): calibration run from the result store, used instead of output_dir
+    :param engine (str): simulation engine of the model, BRModel.default_engine by default
+    """
+
+    factory = ExperimentalSetup(incidence, age_groups, strains, contact_matrix, pop_size, mu, sigma, engine)
     model, _ = factory.get_model_and_optimizer()
     model_obj = factory.setup_model(model)
 
-    exposed_list, lam_list, a_list, delta, r_squared = get_parameters(output_dir)
-    exposed_list_cor = get_exposed_ready_for_simulation(exposed_list, incidence, age_groups, strains)
+    if run is not None:
+        params = run.parameters
+        exposed_list, lam_list, a_list, r_squared = params['exposed'], params['lambda'], params['a'], params['R2']
+        calib_data, orig_data = run.calibration_data, run.original_data
+    else:
+        exposed_list, lam_list, a_list, delta, r_squared = get_parameters(output_dir)
 
-    calib_data_path = f'{output_dir}/{CALIBRATION_DATA_FILE}'
-    calib_data = pd.read_csv(calib_data_path, index_col=0)
+        calib_data_path = f'{output_dir}/{CALIBRATION_DATA_FILE}'
+        calib_data = pd.read_csv(calib_data_path, index_col=0)
 
-    orig_data_path = f'{output_dir}/{INCIDENCE_DATA_FILE}'
-    orig_data = pd.read_csv(orig_data_path, index_col=0)
+        orig_data_path = f'{output_dir}/{INCIDENCE_DATA_FILE}'
+        orig_data = pd.read_csv(orig_data_path, index_col=0)
+    exposed_list_cor = get_exposed_ready_for_simulation(exposed_list, incidence, age_groups, strains)
 
     model_obj.set_attributes()
     model_obj.init_simul_params(exposed_list=exposed_list_cor, lam_list=lam_list, a=a_list)